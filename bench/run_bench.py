@@ -0,0 +1,216 @@
+"""Load-test the Flask app against local upstream stand-ins.
+
+Starts the Yahoo and mfapi stand-ins from ``standins``, points the app at
+them, serves the app on a threaded local server and drives each endpoint at
+rising concurrency. Results are written as JSON so runs can be diffed:
+
+    python bench/run_bench.py --concurrency 1,4,16,64 --duration 10 --output bench-results.json
+
+App settings such as YAHOO_RATE_LIMIT or QUOTE_CACHE_DB are read from the
+environment as usual, so the same script measures any configuration.
+"""
+import argparse
+import logging
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standins import UpstreamBehavior, YahooStandIn, MfapiStandIn, StandInYahooClient
+
+ENDPOINTS = ('stock-data', 'stocks', 'mutual-fund')
+LOGIN = {'email': 'demo@example.com', 'password': 'demo123'}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma separated subset of ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--concurrency', default='1,4,16,64', help='comma separated client counts, run in order')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per endpoint and concurrency level')
+    parser.add_argument('--symbols', type=int, default=50, help='size of the stock symbol pool')
+    parser.add_argument('--schemes', type=int, default=20, help='size of the mutual fund scheme pool')
+    parser.add_argument('--portfolio-size', type=int, default=10, help='holdings per /stocks session')
+    parser.add_argument('--latency-ms', type=float, default=150, help='stand-in response latency')
+    parser.add_argument('--jitter-ms', type=float, default=50, help='uniform jitter around the latency')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='probability of a 429 from the Yahoo stand-in')
+    parser.add_argument('--outage', choices=('none', 'yahoo', 'mfapi', 'both'), default='none', help='upstreams answering 503')
+    parser.add_argument('--seed', type=int, default=1, help='seed for stand-in behavior and request mix')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    return parser.parse_args(argv)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, errors, elapsed):
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            'p50': _round(percentile(ms, 0.50)),
+            'p95': _round(percentile(ms, 0.95)),
+            'p99': _round(percentile(ms, 0.99)),
+            'mean': _round(statistics.fmean(ms) if ms else None),
+            'max': _round(ms[-1] if ms else None)
+        }
+    }
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+class Bench:
+    def __init__(self, args, base_url):
+        self.args = args
+        self.base_url = base_url
+        self.symbols = [f'SYM{i}.NS' for i in range(args.symbols)]
+        self.schemes = [str(100000 + i) for i in range(args.schemes)]
+
+    def client(self):
+        """Logged-in session; /stocks clients also get a portfolio"""
+        session = requests.Session()
+        response = session.post(f'{self.base_url}/login', data=LOGIN, allow_redirects=False)
+        if response.status_code != 302:
+            raise RuntimeError(f'login failed with status {response.status_code}')
+        return session
+
+    def add_portfolio(self, session, worker):
+        picks = random.Random(self.args.seed + worker).sample(self.symbols, min(self.args.portfolio_size, len(self.symbols)))
+        for symbol in picks:
+            session.post(f'{self.base_url}/stocks', data={'symbol': symbol}, allow_redirects=False)
+
+    def request(self, endpoint, session, rng):
+        if endpoint == 'stock-data':
+            response = session.get(f'{self.base_url}/api/stock-data', params={'symbol': rng.choice(self.symbols)})
+            return response.status_code == 200 and response.json().get('success', False)
+        if endpoint == 'stocks':
+            response = session.get(f'{self.base_url}/stocks')
+            return response.status_code == 200
+        response = session.get(f'{self.base_url}/api/mutual-fund', params={'scheme_code': rng.choice(self.schemes)})
+        return response.status_code == 200 and response.json().get('success', False)
+
+    def run_level(self, endpoint, concurrency):
+        sessions = [self.client() for _ in range(concurrency)]
+        if endpoint == 'stocks':
+            for worker, session in enumerate(sessions):
+                self.add_portfolio(session, worker)
+
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        start_event = threading.Event()
+        deadline = [0.0]
+
+        def worker(index):
+            rng = random.Random(self.args.seed * 1000 + index)
+            local = []
+            failed = 0
+            start_event.wait()
+            while time.perf_counter() < deadline[0]:
+                started = time.perf_counter()
+                try:
+                    ok = self.request(endpoint, sessions[index], rng)
+                except requests.RequestException:
+                    ok = False
+                local.append(time.perf_counter() - started)
+                if not ok:
+                    failed += 1
+            with lock:
+                latencies.extend(local)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        started = time.perf_counter()
+        deadline[0] = started + self.args.duration
+        start_event.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        for session in sessions:
+            session.close()
+        return summarize(latencies, errors[0], elapsed)
+
+def serve(app):
+    from werkzeug.serving import make_server
+    # Per-request access logs would dominate the benchmark's own output
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    args = parse_args(argv)
+    endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f'unknown endpoints: {", ".join(sorted(unknown))}')
+    levels = [int(level) for level in args.concurrency.split(',')]
+    started_at = datetime.now(timezone.utc).isoformat()
+
+    yahoo = YahooStandIn(UpstreamBehavior(
+        args.latency_ms, args.jitter_ms, args.rate_limit, args.outage in ('yahoo', 'both'), seed=args.seed
+    )).start()
+    mfapi = MfapiStandIn(UpstreamBehavior(
+        args.latency_ms, args.jitter_ms, 0.0, args.outage in ('mfapi', 'both'), seed=args.seed + 1
+    )).start()
+
+    # The app reads its upstream URLs and settings at import time
+    os.environ['MFAPI_BASE_URL'] = f'{mfapi.base_url}/mf'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import main as app_module
+    app_module.market_data().yf = StandInYahooClient(yahoo.base_url)
+    server = serve(app_module.app)
+    bench = Bench(args, f'http://127.0.0.1:{server.server_port}')
+
+    results = []
+    try:
+        for endpoint in endpoints:
+            for concurrency in levels:
+                result = bench.run_level(endpoint, concurrency)
+                result.update({'endpoint': endpoint, 'concurrency': concurrency})
+                results.append(result)
+                print(f"{endpoint:>12} c={concurrency:<4} {result['throughput_rps']:>8} rps  "
+                      f"p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+                      f"p99={result['latency_ms']['p99']}ms errors={result['errors']}", file=sys.stderr)
+    finally:
+        server.shutdown()
+        yahoo.stop()
+        mfapi.stop()
+
+    report = {
+        'meta': {
+            'started_at': started_at,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': vars(args),
+            'upstream_requests': {'yahoo': yahoo.behavior.requests, 'mfapi': mfapi.behavior.requests}
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
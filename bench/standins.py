@@ -0,0 +1,226 @@
+"""Local stand-ins for the upstream APIs the app talks to.
+
+``YahooStandIn`` serves Yahoo Finance shaped JSON (v7 quote, v8 chart and
+spark) and ``MfapiStandIn`` serves ``/mf/{code}`` NAV histories. Both run on
+a background ThreadingHTTPServer and share ``UpstreamBehavior``, which
+injects latency, 429 responses and outages so benchmarks can reproduce
+slow or failing upstreams.
+
+``StandInYahooClient`` exposes the small part of the yfinance API the app
+uses (``Ticker(...).info``, ``Ticker(...).history`` and ``download``) on top
+of the Yahoo stand-in, so the benchmark can swap it in for ``yf``.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import requests
+
+class UpstreamBehavior:
+    """Mutable knobs shared by a stand-in server's request handlers"""
+    def __init__(self, latency_ms=100, jitter_ms=20, rate_limit_probability=0.0, outage=False, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_probability = rate_limit_probability
+        self.outage = outage
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def apply(self):
+        """Sleep for the configured latency and return an error status, or None to answer normally"""
+        with self.lock:
+            self.requests += 1
+            delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            rate_limited = self.random.random() < self.rate_limit_probability
+        time.sleep(delay)
+        if self.outage:
+            return 503
+        if rate_limited:
+            return 429
+        return None
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming clients may hang up after the first record
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class _StandInServer:
+    """Run a handler class on 127.0.0.1 with an ephemeral port"""
+    def __init__(self, behavior):
+        self.behavior = behavior
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status = server.behavior.apply()
+                if status is not None:
+                    self._send_json(status, {'error': 'stand-in injected failure'})
+                    return
+                url = urlparse(self.path)
+                try:
+                    status, payload = server.route(url.path, parse_qs(url.query))
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                self._send_json(status, payload)
+
+            def _send_json(self, status, payload):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _QuietHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def route(self, path, query):
+        raise NotImplementedError
+
+def _price_for(symbol, day_offset=0):
+    """Deterministic pseudo price so repeated runs see the same data"""
+    seed = sum(ord(c) * (i + 1) for i, c in enumerate(symbol))
+    return round(100 + seed % 2900 + day_offset * ((seed % 7) - 3), 2)
+
+class YahooStandIn(_StandInServer):
+    """Yahoo Finance shaped responses; symbols starting with BAD are unknown"""
+    def route(self, path, query):
+        if path == '/v7/finance/quote':
+            symbols = query.get('symbols', [''])[0].split(',')
+            return 200, {'quoteResponse': {'result': [self._quote(s) for s in symbols if self._known(s)], 'error': None}}
+        if path.startswith('/v8/finance/chart/'):
+            symbol = path.rsplit('/', 1)[-1]
+            if not self._known(symbol):
+                return 404, {'chart': {'result': None, 'error': {'code': 'Not Found'}}}
+            return 200, {'chart': {'result': [self._chart(symbol)], 'error': None}}
+        if path == '/v8/finance/spark':
+            symbols = query.get('symbols', [''])[0].split(',')
+            return 200, {'spark': {'result': [
+                {'symbol': s, 'response': [self._chart(s)]} for s in symbols if self._known(s)
+            ], 'error': None}}
+        return 404, {'error': 'unknown path'}
+
+    @staticmethod
+    def _known(symbol):
+        return bool(symbol) and not symbol.startswith('BAD')
+
+    @staticmethod
+    def _quote(symbol):
+        price = _price_for(symbol)
+        previous = _price_for(symbol, -1)
+        return {
+            'symbol': symbol,
+            'longName': f'{symbol.split(".")[0]} Industries Ltd.',
+            'regularMarketPrice': price,
+            'previousClose': previous,
+            'regularMarketPreviousClose': previous
+        }
+
+    @staticmethod
+    def _chart(symbol, days=5):
+        today = datetime.now(timezone.utc).replace(hour=10, minute=0, second=0, microsecond=0)
+        timestamps = [int((today - timedelta(days=days - 1 - i)).timestamp()) for i in range(days)]
+        closes = [_price_for(symbol, i - days + 1) for i in range(days)]
+        return {
+            'meta': {'symbol': symbol, 'currency': 'INR'},
+            'timestamp': timestamps,
+            'indicators': {'quote': [{'close': closes}]}
+        }
+
+class MfapiStandIn(_StandInServer):
+    """api.mfapi.in shaped NAV histories, newest record first"""
+    def __init__(self, behavior, records=2500):
+        super().__init__(behavior)
+        self.records = records
+        self.bodies = {}
+
+    def route(self, path, query):
+        parts = path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'mf' or not parts[1].isdigit():
+            return 404, {'status': 'ERROR'}
+        code = parts[1]
+        body = self.bodies.get(code)
+        if body is None:
+            end = date.today()
+            base = 10 + int(code) % 90
+            data = [
+                {'date': (end - timedelta(days=i)).strftime('%d-%m-%Y'), 'nav': f'{base + (self.records - i) * 0.01:.4f}'}
+                for i in range(self.records)
+            ]
+            body = self.bodies[code] = json.dumps({
+                'meta': {'fund_house': 'Stand-in AMC', 'scheme_name': f'Stand-in Fund {code}', 'scheme_code': int(code)},
+                'data': data,
+                'status': 'SUCCESS'
+            }).encode()
+        return 200, body
+
+def _closes_frame(chart):
+    index = pd.to_datetime(chart['timestamp'], unit='s')
+    return pd.DataFrame({'Close': chart['indicators']['quote'][0]['close']}, index=index)
+
+class StandInYahooClient:
+    """Drop-in for the parts of the yfinance module the app calls"""
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def _get(self, path, **params):
+        response = self.session.get(f'{self.base_url}{path}', params=params, timeout=10)
+        if response.status_code == 429:
+            raise Exception('429 Client Error: Too Many Requests')
+        if response.status_code >= 500:
+            raise Exception(f'{response.status_code} Server Error')
+        return response
+
+    def Ticker(self, symbol):
+        client = self
+
+        class Ticker:
+            @property
+            def info(self):
+                results = client._get('/v7/finance/quote', symbols=symbol).json()['quoteResponse']['result']
+                return results[0] if results else {}
+
+            def history(self, period='5d', **kwargs):
+                response = client._get(f'/v8/finance/chart/{symbol}', range=period, interval='1d')
+                if response.status_code != 200:
+                    return pd.DataFrame()
+                return _closes_frame(response.json()['chart']['result'][0])
+
+        return Ticker()
+
+    def download(self, tickers, period='5d', group_by='column', **kwargs):
+        if isinstance(tickers, str):
+            tickers = tickers.split()
+        results = self._get('/v8/finance/spark', symbols=','.join(tickers), range=period).json()['spark']['result']
+        frames = {result['symbol']: _closes_frame(result['response'][0]) for result in results}
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
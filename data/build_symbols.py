@@ -0,0 +1,86 @@
+"""Rebuild data/symbols.csv, the bundled symbol master, from the exchanges' own lists.
+
+NSE publishes every listed equity in EQUITY_L.csv; BSE's "List of Scrips"
+page exports its securities as a CSV. The output has one row per listing
+(symbol, exchange, company_name), the format SymbolMaster loads:
+
+    python data/build_symbols.py                      # NSE, downloaded
+    python data/build_symbols.py --bse Equity.csv     # plus a saved BSE export
+    python data/build_symbols.py --nse EQUITY_L.csv   # from a saved NSE file
+
+The app never downloads these lists itself; rerun this before a deploy to
+refresh the snapshot.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+
+import requests
+
+NSE_EQUITY_URL = 'https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv'
+OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'symbols.csv')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nse', default=NSE_EQUITY_URL, help='EQUITY_L.csv path or URL (default: download from NSE)')
+    parser.add_argument('--bse', help="path to BSE's List of Scrips CSV export (optional)")
+    parser.add_argument('--output', default=OUTPUT, help='where to write the symbol master')
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='refuse to write fewer listings than this (guards against error pages)')
+    return parser.parse_args(argv)
+
+def read_csv(source):
+    """Rows of a CSV from a local path or an http(s) URL, with keys and values stripped"""
+    if source.startswith(('http://', 'https://')):
+        # NSE's archive rejects requests without a browser-like User-Agent
+        response = requests.get(source, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
+        response.raise_for_status()
+        text = response.content.decode('utf-8-sig')
+    else:
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            text = f.read()
+    for row in csv.DictReader(io.StringIO(text)):
+        yield {key.strip(): (value or '').strip() for key, value in row.items() if key}
+
+def nse_listings(rows):
+    for row in rows:
+        symbol = row.get('SYMBOL', '').upper()
+        if symbol:
+            yield symbol, 'NS', row.get('NAME OF COMPANY') or symbol
+
+def bse_listings(rows):
+    """Active equity scrips; other instruments and suspended or delisted scrips are skipped"""
+    for row in rows:
+        if (row.get('Status') or 'Active') != 'Active' or (row.get('Instrument') or 'Equity') != 'Equity':
+            continue
+        symbol = row.get('Security Id', '').upper()
+        if symbol:
+            yield symbol, 'BO', row.get('Issuer Name') or row.get('Security Name') or symbol
+
+def main(argv=None):
+    args = parse_args(argv)
+    listings = {}
+    sources = [(nse_listings, args.nse)] + ([(bse_listings, args.bse)] if args.bse else [])
+    for parse, source in sources:
+        for symbol, exchange, name in parse(read_csv(source)):
+            listings.setdefault((symbol, exchange), name)
+
+    if len(listings) < args.min_rows:
+        print(f"Only {len(listings)} listings read; not overwriting {args.output}", file=sys.stderr)
+        return 1
+
+    tmp_path = f'{args.output}.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['symbol', 'exchange', 'company_name'])
+        # NSE rows first for each symbol, so its company name wins in SymbolMaster
+        for (symbol, exchange), name in sorted(listings.items(), key=lambda item: (item[0][0], item[0][1] != 'NS')):
+            writer.writerow([symbol, exchange, name])
+    os.replace(tmp_path, args.output)
+    print(f"Wrote {len(listings)} listings to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
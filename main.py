@@ -1,50 +1,145 @@
-from flask import Flask, render_template, request, redirect, session, flash, url_for, jsonify
+import time
+
+# Startup timings are measured from here, so they include framework imports
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Blueprint, render_template, request, redirect, session, flash, url_for, jsonify, Response, stream_with_context, g
 from dotenv import load_dotenv
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from functools import wraps
 import uuid
 import json
-from datetime import datetime
-import yfinance as yf
-import time
-import random
+import io
+import gzip
+import hashlib
+from datetime import datetime, date, timedelta, timezone, time as dt_time
+import math
 import threading
+import sqlite3
+import queue
+import re
+import codecs
+import struct
+import bisect
+import heapq
+import sys
+import tempfile
+import csv
+import difflib
+from array import array
+import metrics
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from functools import lru_cache
+from collections import OrderedDict, deque
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24))
+# Leveled logging; messages use lazy %-formatting so disabled levels cost a level check
+class JsonLogFormatter(logging.Formatter):
+    """Format each record as one JSON object, including any ``extra`` fields"""
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+logger = logging.getLogger('fintrack')
+_log_handler = logging.StreamHandler()
+if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+    _log_handler.setFormatter(JsonLogFormatter())
+else:
+    _log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+logger.addHandler(_log_handler)
+logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+logger.propagate = False
+
+# Routes live on a blueprint; create_app() builds the Flask app around it
+views = Blueprint('fintrack', __name__)
 
 # Set production mode if needed
 if os.getenv('FORCE_PRODUCTION', 'false').lower() == 'true':
     os.environ['PRODUCTION'] = 'true'
-    print("⚠️ Production mode forced via FORCE_PRODUCTION environment variable")
+    logger.warning("Production mode forced via FORCE_PRODUCTION environment variable")
 
 # Detect production environment
 is_production = os.getenv('VERCEL_ENV') == 'production' or os.getenv('PRODUCTION') == 'true'
 if is_production:
-    print("🚀 Running in production mode - using optimized data fetching")
+    logger.info("Running in production mode")
 else:
-    print("🔧 Running in development mode - will attempt to use live data")
+    logger.info("Running in development mode")
+
+# Instrumentation, exposed at /metrics
+request_latency = metrics.registry.histogram(
+    'fintrack_request_duration_seconds', 'Flask request latency by route', ('route', 'method'))
+request_count = metrics.registry.counter(
+    'fintrack_requests_total', 'Flask requests by route and status', ('route', 'method', 'status'))
+upstream_latency = metrics.registry.histogram(
+    'fintrack_upstream_duration_seconds', 'Upstream call latency by provider', ('provider',))
+upstream_errors = metrics.registry.counter(
+    'fintrack_upstream_errors_total', 'Upstream call failures by provider and kind', ('provider', 'kind'))
+fallback_used = metrics.registry.counter(
+    'fintrack_fallback_total', 'Answers served from a fallback tier', ('source', 'tier'))
+
+# Cold-start timings in seconds, exposed at /metrics and /api/cache-stats
+startup_timings = {}
+metrics.registry.callback(
+    'fintrack_startup_seconds', 'Cold-start timings by phase',
+    lambda: {(phase,): seconds for phase, seconds in startup_timings.items()}, ('phase',))
+
+@views.before_app_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@views.after_app_request
+def _record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        now = time.perf_counter()
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_latency.observe(now - started, route, request.method)
+        request_count.inc(route, request.method, str(response.status_code))
+        if 'first_request' not in startup_timings:
+            startup_timings['first_request'] = round(now - started, 4)
+            startup_timings['import_to_first_response'] = round(now - IMPORT_STARTED, 4)
+            logger.info(
+                "First request %s %s took %.1fms (%.1fms after import started, market data %s)",
+                request.method, route, (now - started) * 1000, (now - IMPORT_STARTED) * 1000,
+                'loaded' if 'market_data_import' in startup_timings else 'not loaded')
+    return response
+
+def load_users(credentials):
+    """Parse 'email:password:name,...' into the users dict"""
+    users = {}
+    for user_entry in credentials.split(','):
+        if user_entry and ':' in user_entry:
+            parts = user_entry.strip().split(':')
+            if len(parts) >= 3:
+                email, password, name = parts[0], parts[1], parts[2]
+                users[email] = {"password": password, "name": name}
+    return users
 
 # Load user credentials from .env file
-users = {}
-user_credentials = os.getenv('USER_CREDENTIALS', 'demo@example.com:demo123:Demo User')
-for user_entry in user_credentials.split(','):
-    if user_entry and ':' in user_entry:
-        parts = user_entry.strip().split(':')
-        if len(parts) >= 3:
-            email, password, name = parts[0], parts[1], parts[2]
-            users[email] = {"password": password, "name": name}
+users = load_users(os.getenv('USER_CREDENTIALS', 'demo@example.com:demo123:Demo User'))
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('fintrack.login'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -143,73 +238,1107 @@ FALLBACK_STOCKS = {
     }
 }
 
-# Server-side caching for stock data
-# Create a thread-safe cache with expiration
-class ExpiringCache:
-    def __init__(self):
-        self.cache = {}
+# Indian exchanges (NSE/BSE) trade 09:15-15:30 IST, Monday to Friday
+IST = timezone(timedelta(hours=5, minutes=30))
+MARKET_OPEN = dt_time(9, 15)
+MARKET_CLOSE = dt_time(15, 30)
+
+def is_market_open(now=None):
+    """Return True during regular NSE/BSE trading hours (holidays not considered)"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+def seconds_until_market_open(now=None):
+    """Seconds until the next regular session opens (0 while the market is open)"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    if is_market_open(now):
+        return 0
+    candidate = now.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return (candidate - now).total_seconds()
+
+# Quotes move during the session but not after the close
+QUOTE_TTL_MARKET = int(os.getenv('QUOTE_TTL_MARKET', '300'))
+QUOTE_TTL_CLOSED = int(os.getenv('QUOTE_TTL_CLOSED', '21600'))
+
+def quote_ttl(now=None):
+    """Freshness lifetime for a quote cached right now; a closed-market quote expires by the next open"""
+    until_open = seconds_until_market_open(now)
+    if not until_open:
+        return QUOTE_TTL_MARKET
+    return max(1, min(QUOTE_TTL_CLOSED, int(until_open)))
+
+# Optional on-disk tier shared by every worker process on the host
+class PersistentCache:
+    """SQLite-backed key/value store with expiry, used beneath TTLCache.
+
+    The database runs in WAL mode so many processes can read while one
+    writes. Each thread keeps its own connection. Failures are logged and
+    treated as misses so the disk tier can never break a request.
+    """
+    def __init__(self, path, retention=7 * 24 * 3600, compact_every=500):
+        self.path = path
+        self.retention = retention
+        self.compact_every = compact_every
+        self.local = threading.local()
+        self.writes = 0
         self.lock = threading.Lock()
-        
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
     def get(self, key):
+        """Return (value, stored_at, expires_at) or None"""
+        try:
+            row = self._conn().execute(
+                "SELECT value, stored_at, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Persistent cache read failed for %s: %s", key, e)
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key, value, stored_at, expires_at):
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, separators=(',', ':')), stored_at, expires_at)
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("Persistent cache write failed for %s: %s", key, e)
+            return
+
         with self.lock:
-            if key in self.cache:
-                item = self.cache[key]
-                if time.time() - item['timestamp'] < 3600:  # 1 hour cache
-                    return item['data']
-                # Expired but keep for emergency fallback
+            self.writes += 1
+            due = self.writes % self.compact_every == 0
+        if due:
+            self.compact()
+
+    def compact(self):
+        """Drop entries expired for longer than the retention window and checkpoint the WAL"""
+        try:
+            conn = self._conn()
+            deleted = conn.execute(
+                "DELETE FROM cache WHERE expires_at < ?", (time.time() - self.retention,)
+            ).rowcount
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return deleted
+        except sqlite3.Error as e:
+            logger.warning("Persistent cache compaction failed: %s", e)
+            return 0
+
+# Enabled by pointing QUOTE_CACHE_DB at a writable path (e.g. /tmp/fintrack-cache.db)
+QUOTE_CACHE_DB = os.getenv('QUOTE_CACHE_DB')
+persistent_cache = None
+if QUOTE_CACHE_DB:
+    try:
+        persistent_cache = PersistentCache(
+            QUOTE_CACHE_DB,
+            retention=int(os.getenv('QUOTE_CACHE_RETENTION', str(7 * 24 * 3600)))
+        )
+    except sqlite3.Error as e:
+        logger.warning("Persistent quote cache disabled: %s", e)
+
+# Bodies smaller than this are sent uncompressed; gzip only pays off above ~1KB
+GZIP_MIN_BYTES = 1024
+
+class EncodedPayload:
+    """A JSON payload serialized once, with its ETag and an optional gzipped copy"""
+    __slots__ = ('body', 'gzipped', 'etag')
+
+    def __init__(self, payload):
+        # Same bytes jsonify would produce: sorted keys, compact separators
+        self.body = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.gzipped = gzip.compress(self.body) if len(self.body) >= GZIP_MIN_BYTES else None
+
+# Server-side caching for stock data
+class TTLCache:
+    """Thread-safe, bounded cache with per-entry TTLs and LRU eviction.
+
+    Keys are spread over independently locked shards so readers of different
+    symbols do not contend. Expired entries are kept (until evicted) so they
+    can be served stale while a background refresh runs, or as an emergency
+    fallback when upstream fails. Callables in ``listeners`` are called with
+    (key, value) after every set(), on the caller's thread, so they must
+    return quickly.
+    """
+    def __init__(self, max_entries=2048, shards=16, default_ttl=quote_ttl, backing=None, namespace=''):
+        self.backing = backing
+        self.listeners = []
+        self.namespace = namespace
+        self.shards = [OrderedDict() for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.max_per_shard = max(1, max_entries // shards)
+        self.default_ttl = default_ttl
+        self.refreshing = set()
+        self.refresh_lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'stale_serves': 0, 'evictions': 0, 'refreshes': 0}
+
+    def _shard(self, key):
+        index = hash(key) % len(self.shards)
+        return self.shards[index], self.locks[index]
+
+    def _count(self, name):
+        # Plain int increments; approximate under heavy contention by design
+        self.counters[name] += 1
+
+    def get(self, key):
+        """Return the value if present and fresh, otherwise None"""
+        shard, lock = self._shard(key)
+        with lock:
+            item = shard.get(key)
+            if item is not None and time.time() < item['expires']:
+                shard.move_to_end(key)
+                self._count('hits')
+                return item['data']
+
+        # Read through to the disk tier, also when our copy has expired:
+        # another worker may have written a fresher row. Stale rows are
+        # kept in memory too so get_stale() can serve them
+        row = self._newer_disk_row(key, item)
+        if row is not None:
+            data, stored_at, expires_at = row
+            self._store(key, data, stored_at, expires_at)
+            if time.time() < expires_at:
+                self._count('disk_hits')
+                return data
+        self._count('misses')
+        return None
+
+    def _newer_disk_row(self, key, item):
+        """The disk row for key if it expires later than the in-memory item (or there is none)"""
+        if self.backing is None:
             return None
-            
-    def set(self, key, value):
+        row = self.backing.get(self.namespace + str(key))
+        if row is None or (item is not None and row[2] <= item['expires']):
+            return None
+        return row
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.default_ttl() if callable(self.default_ttl) else self.default_ttl
+        now = time.time()
+        self._store(key, value, now, now + ttl)
+        if self.backing is not None:
+            self.backing.set(self.namespace + str(key), value, now, now + ttl)
+        for listener in self.listeners:
+            listener(key, value)
+
+    def _store(self, key, value, stored_at, expires_at):
+        shard, lock = self._shard(key)
+        with lock:
+            shard[key] = {'data': value, 'timestamp': stored_at, 'expires': expires_at}
+            shard.move_to_end(key)
+            while len(shard) > self.max_per_shard:
+                shard.popitem(last=False)
+                self._count('evictions')
+
+    def get_stale(self, key):
+        """Return the value even if expired, as an emergency fallback"""
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+        self._count('stale_serves')
+        return entry[0]
+
+    def get_entry(self, key):
+        """Return (value, timestamp, expires) for a key, fresh or not, without touching stats"""
+        shard, lock = self._shard(key)
+        with lock:
+            item = shard.get(key)
+            if item is not None:
+                shard.move_to_end(key)
+                if time.time() < item['expires']:
+                    return item['data'], item['timestamp'], item['expires']
+
+        row = self._newer_disk_row(key, item)
+        if row is not None:
+            self._store(key, *row)
+            return row
+        if item is not None:
+            return item['data'], item['timestamp'], item['expires']
+        return None
+
+    def get_encoded(self, key, value):
+        """Return (EncodedPayload, expires) if value is the entry cached under key.
+
+        The payload is serialized on first use and kept with the entry, so
+        repeat requests for the same value skip json encoding entirely.
+        """
+        shard, lock = self._shard(key)
+        with lock:
+            item = shard.get(key)
+            if item is None or item['data'] is not value:
+                return None
+            encoded = item.get('encoded')
+            if encoded is None:
+                encoded = item['encoded'] = EncodedPayload(value)
+            return encoded, item['expires']
+
+    def refresh_async(self, key, fn, *args):
+        """Run fn(*args) on a background thread unless a refresh for key is already running"""
+        with self.refresh_lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+        self._count('refreshes')
+
+        def run():
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.warning("Background refresh failed for %s: %s", key, e)
+            finally:
+                with self.refresh_lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def stats(self):
+        counters = dict(self.counters)
+        found = counters['hits'] + counters['disk_hits']
+        lookups = found + counters['misses']
+        counters['hit_ratio'] = round(found / lookups, 4) if lookups else 0
+        counters['entries'] = len(self)
+        counters['max_entries'] = self.max_per_shard * len(self.shards)
+        return counters
+
+# Initialize the cache
+stock_cache = TTLCache(
+    max_entries=int(os.getenv('STOCK_CACHE_MAX_ENTRIES', '2048')),
+    backing=persistent_cache,
+    namespace='stock:'
+)
+
+# AMFI publishes the day's NAVs by 23:00 IST on business days
+NAV_PUBLISH_TIME = dt_time(23, 0)
+
+def seconds_until_next_nav(now=None):
+    """Seconds until the next NAV publication, used as the NAV cache TTL"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    candidate = now.replace(hour=NAV_PUBLISH_TIME.hour, minute=NAV_PUBLISH_TIME.minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    # Never cache for less than a few minutes around the publication time
+    return max((candidate - now).total_seconds(), 300)
+
+# A NAV that is late on mfapi is retried this often until the next morning's
+# cutoff; after that the business day is taken to be a holiday with no NAV
+NAV_RETRY_INTERVAL = int(os.getenv('NAV_RETRY_INTERVAL', '1800'))
+NAV_LATE_CUTOFF = dt_time(10, 0)
+
+def expected_nav_date(now=None):
+    """The latest business day whose NAV should be published by now"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    day = now.date() if now.time() >= NAV_PUBLISH_TIME else now.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+def nav_ttl(latest_ordinal, now=None):
+    """Cache lifetime for NAV data whose newest record is dated latest_ordinal.
+
+    Until the next publication, unless the record predates the NAV that
+    should already be out; that is retried every NAV_RETRY_INTERVAL instead.
+    """
+    now = (now or datetime.now(IST)).astimezone(IST)
+    ttl = seconds_until_next_nav(now)
+    expected = expected_nav_date(now)
+    retry_until = datetime.combine(expected + timedelta(days=1), NAV_LATE_CUTOFF, tzinfo=IST)
+    if latest_ordinal < expected.toordinal() and now < retry_until:
+        return min(ttl, NAV_RETRY_INTERVAL)
+    return ttl
+
+mf_cache = TTLCache(max_entries=1024, default_ttl=seconds_until_next_nav, backing=persistent_cache, namespace='mf:')
+
+# Request coalescing for upstream fetches
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight call.
+
+    The first caller for a key runs the function; callers arriving while it
+    is running wait for it and receive the same result or exception.
+    """
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self.calls[key] = call
+                self.leaders += 1
+                is_leader = True
+            else:
+                self.coalesced += 1
+                is_leader = False
+
+        if not is_leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn(*args, **kwargs)
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call['event'].set()
+
+    def stats(self):
         with self.lock:
-            self.cache[key] = {
-                'data': value,
-                'timestamp': time.time()
+            return {
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'in_flight': len(self.calls)
             }
-            
-    def get_stale(self, key):
-        # Return even expired data as emergency fallback
+
+# Shared by every code path that goes upstream for a quote
+stock_fetches = SingleFlight()
+
+# Process-wide protection for outbound Yahoo Finance calls
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling upstream while it is rate limited or failing"""
+
+class TokenBucket:
+    """Token-bucket rate limiter.
+
+    Acquiring a token never sleeps while tokens are available; callers only
+    wait (up to a bound) when the bucket is empty.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.throttled = 0
+
+    def _reserve(self):
+        """Take a token if one is available, else return seconds until one will be"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout=0):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._reserve()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                self.throttled += 1
+                return False
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Stop calling a failing upstream for a cool-down period.
+
+    Opens after ``failure_threshold`` consecutive failures, or immediately on
+    a rate-limit response with an exponentially growing cool-down. Once the
+    cool-down passes a single trial call is let through (half-open); its
+    outcome closes or re-opens the circuit.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, backoff_base=5, backoff_max=300):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failures = 0
+        self.rate_limited = 0
+        self.open_until = 0
+        self.trial_in_flight = False
+        self.short_circuited = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if time.monotonic() < self.open_until:
+                self.short_circuited += 1
+                return False
+            if self.open_until and self.trial_in_flight:
+                # Half-open: one trial call at a time
+                self.short_circuited += 1
+                return False
+            if self.open_until:
+                self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.rate_limited = 0
+            self.open_until = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.open_until or self.failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.reset_timeout
+
+    def record_rate_limited(self):
+        with self.lock:
+            backoff = min(self.backoff_base * (2 ** self.rate_limited), self.backoff_max)
+            self.rate_limited += 1
+            self.trial_in_flight = False
+            self.open_until = time.monotonic() + backoff
+
+    def stats(self):
         with self.lock:
-            if key in self.cache:
-                return self.cache[key]['data']
+            remaining = max(0, self.open_until - time.monotonic())
+            if not self.open_until:
+                state = 'closed'
+            elif remaining > 0:
+                state = 'open'
+            else:
+                state = 'half_open'
+            return {
+                'state': state,
+                'retry_in': round(remaining, 1),
+                'consecutive_failures': self.failures,
+                'consecutive_rate_limits': self.rate_limited,
+                'short_circuited': self.short_circuited
+            }
+
+yahoo_limiter = TokenBucket(
+    rate=float(os.getenv('YAHOO_RATE_LIMIT', '2')),
+    capacity=float(os.getenv('YAHOO_BURST', '5'))
+)
+yahoo_breaker = CircuitBreaker()
+# Longest a request thread may wait for a rate-limit token
+YAHOO_MAX_WAIT = float(os.getenv('YAHOO_MAX_WAIT', '1.0'))
+
+_market_data = None
+_market_data_lock = threading.Lock()
+
+def market_data():
+    """The yfinance-backed provider module, imported on first use.
+
+    yfinance and pandas take most of the cold-start time, and pages such as
+    /login or /insurance never need them.
+    """
+    global _market_data
+    if _market_data is None:
+        # Other threads must not see the module while it is half-imported
+        with _market_data_lock:
+            if _market_data is None:
+                started = time.perf_counter()
+                import market_data as module
+                startup_timings['market_data_import'] = round(time.perf_counter() - started, 4)
+                logger.info("Loaded market data provider in %.1fms", startup_timings['market_data_import'] * 1000)
+                _market_data = module
+    return _market_data
+
+def _is_rate_limited(error):
+    message = str(error)
+    return type(error).__name__ == 'YFRateLimitError' or '429' in message or 'Too Many Requests' in message
+
+def call_yahoo(provider, fn, *args, **kwargs):
+    """Run one Yahoo Finance call under the shared rate limiter and circuit breaker.
+
+    ``provider`` names the call (e.g. 'yfinance_info') in upstream metrics.
+    """
+    if not yahoo_breaker.allow():
+        upstream_errors.inc(provider, 'short_circuit')
+        raise UpstreamUnavailable('Yahoo Finance circuit is open')
+    if not yahoo_limiter.acquire(timeout=YAHOO_MAX_WAIT):
+        # Give the half-open trial slot back; nothing was sent
+        with yahoo_breaker.lock:
+            yahoo_breaker.trial_in_flight = False
+        upstream_errors.inc(provider, 'throttled')
+        raise UpstreamUnavailable('Yahoo Finance rate limit reached')
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        if _is_rate_limited(e):
+            yahoo_breaker.record_rate_limited()
+            upstream_errors.inc(provider, 'rate_limited')
+        else:
+            yahoo_breaker.record_failure()
+            upstream_errors.inc(provider, 'error')
+        raise
+    finally:
+        upstream_latency.observe(time.perf_counter() - started, provider)
+    yahoo_breaker.record_success()
+    return result
+
+# Mutual fund NAVs from api.mfapi.in
+class MutualFundClient:
+    """Pooled, cached client for the latest NAV of a scheme.
+
+    Uses one keep-alive HTTP session for every call, caches NAVs in mf_cache
+    until the next publication (briefly, if mfapi does not have it yet), and stops reading the response once the
+    latest NAV record has arrived instead of downloading the full history.
+    """
+    BASE_URL = os.getenv('MFAPI_BASE_URL', 'https://api.mfapi.in/mf')
+    META_RE = re.compile(r'"meta"\s*:\s*(?=\{)')
+    DATA_RE = re.compile(r'"data"\s*:\s*\[\s*')
+
+    def __init__(self, cache, timeout=10, pool_size=20):
+        self.cache = cache
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.bytes_read = 0
+
+    def latest_nav(self, scheme_code):
+        """Return the latest NAV dict for a scheme, or None if upstream has none"""
+        cached_data = self.cache.get(scheme_code)
+        if cached_data:
+            return cached_data
+        return stock_fetches.do(('mf', scheme_code), self._fetch_latest_nav, scheme_code)
+
+    def _fetch_latest_nav(self, scheme_code):
+        records = self.iter_records(scheme_code)
+        try:
+            meta, latest = next(records)
+        except StopIteration:
             return None
+        finally:
+            # Closing the generator drops the connection before the rest of the history arrives
+            records.close()
 
-# Initialize the cache
-stock_cache = ExpiringCache()
+        if 'scheme_name' not in meta or 'nav' not in latest:
+            return None
+        result = {
+            "success": True,
+            "scheme_code": scheme_code,
+            "scheme_name": meta['scheme_name'],
+            "nav": latest['nav'],
+            "date": latest['date']
+        }
+        try:
+            ttl = nav_ttl(parse_nav_date(latest['date']))
+        except (TypeError, ValueError):
+            ttl = None
+        self.cache.set(scheme_code, result, ttl)
+        return result
+
+    def iter_records(self, scheme_code):
+        """Yield (meta, record) pairs, newest record first, parsing the response as it streams in.
+
+        Raises requests.HTTPError if upstream answers with an error status.
+        """
+        started = time.perf_counter()
+        try:
+            response = self.session.get(f'{self.BASE_URL}/{scheme_code}', timeout=self.timeout, stream=True)
+        except requests.RequestException:
+            upstream_errors.inc('mfapi', 'error')
+            raise
+        finally:
+            upstream_latency.observe(time.perf_counter() - started, 'mfapi')
+
+        with response:
+            if response.status_code != 200:
+                upstream_errors.inc('mfapi', 'rate_limited' if response.status_code == 429 else 'error')
+                # Raise rather than look like an empty history, so callers retry instead of caching nothing
+                response.raise_for_status()
+                return
+            text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            decoder = json.JSONDecoder()
+            text = ''
+            meta = None
+            pos = None
+            for chunk in response.iter_content(chunk_size=8192):
+                self.bytes_read += len(chunk)
+                text += text_decoder.decode(chunk)
+
+                if meta is None:
+                    meta_match = self.META_RE.search(text)
+                    if not meta_match:
+                        continue
+                    try:
+                        meta, _ = decoder.raw_decode(text, meta_match.end())
+                    except ValueError:
+                        meta = None
+                        continue
+                if pos is None:
+                    data_match = self.DATA_RE.search(text)
+                    if not data_match:
+                        continue
+                    pos = data_match.end()
+
+                while True:
+                    while pos < len(text) and text[pos] in ' \t\r\n,':
+                        pos += 1
+                    if pos >= len(text):
+                        break
+                    if text[pos] == ']':
+                        return
+                    try:
+                        record, pos = decoder.raw_decode(text, pos)
+                    except ValueError:
+                        # Record split across chunks; wait for more input
+                        break
+                    yield meta, record
+
+                # Only the unparsed tail needs to stay in memory
+                text = text[pos:]
+                pos = 0
+
+mf_client = MutualFundClient(mf_cache)
+
+def parse_nav_date(value):
+    """Convert an mfapi 'dd-mm-YYYY' date to a proleptic ordinal"""
+    return date(int(value[6:10]), int(value[3:5]), int(value[0:2])).toordinal()
+
+class NavSeries:
+    """NAV history of one scheme as two parallel columns, oldest first.
+
+    ``dates`` holds date ordinals (int32) and ``navs`` the NAVs (float64),
+    about 12 bytes per trading day.
+    """
+    def __init__(self, dates=None, navs=None):
+        self.dates = dates if dates is not None else array('i')
+        self.navs = navs if navs is not None else array('d')
+
+    def __len__(self):
+        return len(self.dates)
+
+    def index_on_or_before(self, ordinal):
+        """Index of the last record dated on or before ordinal, or -1"""
+        return bisect.bisect_right(self.dates, ordinal) - 1
+
+    def period_return(self, days):
+        """Return (start_index, absolute %, CAGR %) over the trailing window, or None if history is too short"""
+        if not self.dates:
+            return None
+        end = len(self.dates) - 1
+        start = self.index_on_or_before(self.dates[end] - days)
+        if start < 0 or self.navs[start] <= 0:
+            return None
+        growth = self.navs[end] / self.navs[start]
+        elapsed = self.dates[end] - self.dates[start]
+        cagr = (growth ** (365.0 / elapsed) - 1) * 100 if elapsed > 0 else 0.0
+        return start, (growth - 1) * 100, cagr
+
+    def max_drawdown(self, since=None):
+        """Return (drawdown %, peak_index, trough_index) over records dated on or after since"""
+        start = 0 if since is None else bisect.bisect_left(self.dates, since)
+        if start >= len(self.navs):
+            return None
+        navs = self.navs
+        peak_index = start
+        worst = (0.0, start, start)
+        for i in range(start, len(navs)):
+            nav = navs[i]
+            if nav > navs[peak_index]:
+                peak_index = i
+            elif navs[peak_index] > 0:
+                drawdown = (nav / navs[peak_index] - 1) * 100
+                if drawdown < worst[0]:
+                    worst = (drawdown, peak_index, i)
+        return worst
+
+class NavHistoryStore:
+    """Local, incrementally updated NAV history per scheme.
+
+    Each scheme is kept as a NavSeries and persisted to one small binary
+    file. The first access backfills the full history from mfapi; after
+    that each update streams only records newer than the last stored date.
+    Histories are re-checked once per NAV publication.
+    """
+    MAGIC = b'NAV1'
+    HEADER = struct.Struct('<4sI')
+
+    def __init__(self, directory, client, max_schemes=256):
+        self.directory = directory
+        self.client = client
+        self.max_schemes = max_schemes
+        self.series = OrderedDict()
+        self.next_check = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, scheme_code):
+        return os.path.join(self.directory, f'{scheme_code}.nav')
+
+    def get(self, scheme_code):
+        """Return the NavSeries for a scheme, updating it from upstream when due"""
+        with self.lock:
+            series = self.series.get(scheme_code)
+            if series is not None:
+                self.series.move_to_end(scheme_code)
+        if series is None:
+            series = self._load(scheme_code)
+        if time.time() >= self.next_check.get(scheme_code, 0):
+            try:
+                series = stock_fetches.do(('nav-history', scheme_code), self._update, scheme_code, series)
+            except Exception as e:
+                # Serve what we have; the next request will retry
+                logger.warning("NAV history update failed for %s: %s", scheme_code, e)
+        self._remember(scheme_code, series)
+        return series
+
+    def _remember(self, scheme_code, series):
+        with self.lock:
+            self.series[scheme_code] = series
+            self.series.move_to_end(scheme_code)
+            while len(self.series) > self.max_schemes:
+                evicted, _ = self.series.popitem(last=False)
+                self.next_check.pop(evicted, None)
+
+    def _update(self, scheme_code, series):
+        last = series.dates[-1] if series.dates else 0
+        new_dates = array('i')
+        new_navs = array('d')
+        for _, record in self.client.iter_records(scheme_code):
+            try:
+                ordinal = parse_nav_date(record['date'])
+                nav = float(record['nav'])
+            except (KeyError, ValueError, TypeError):
+                continue
+            # Records arrive newest first; stop at the first one already stored
+            if ordinal <= last:
+                break
+            new_dates.append(ordinal)
+            new_navs.append(nav)
+
+        self.next_check[scheme_code] = time.time() + nav_ttl(new_dates[0] if new_dates else last)
+        if not new_dates:
+            return series
+
+        new_dates.reverse()
+        new_navs.reverse()
+        updated = NavSeries(series.dates + new_dates, series.navs + new_navs)
+        self._save(scheme_code, updated)
+        return updated
+
+    def _load(self, scheme_code):
+        path = self._path(scheme_code)
+        try:
+            with open(path, 'rb') as f:
+                magic, count = self.HEADER.unpack(f.read(self.HEADER.size))
+                if magic != self.MAGIC:
+                    return NavSeries()
+                dates = array('i')
+                navs = array('d')
+                dates.fromfile(f, count)
+                navs.fromfile(f, count)
+            modified = os.path.getmtime(path)
+        except (OSError, EOFError, struct.error):
+            return NavSeries()
+
+        if sys.byteorder != 'little':
+            dates.byteswap()
+            navs.byteswap()
+        # A file written after the latest publication is already current
+        self.next_check[scheme_code] = modified + nav_ttl(dates[-1] if dates else 0, datetime.fromtimestamp(modified, IST))
+        return NavSeries(dates, navs)
+
+    def _save(self, scheme_code, series):
+        dates, navs = series.dates, series.navs
+        if sys.byteorder != 'little':
+            dates, navs = array('i', dates), array('d', navs)
+            dates.byteswap()
+            navs.byteswap()
+        path = self._path(scheme_code)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, len(dates)))
+                dates.tofile(f)
+                navs.tofile(f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not persist NAV history for %s: %s", scheme_code, e)
+
+NAV_HISTORY_DIR = os.getenv('NAV_HISTORY_DIR', os.path.join(tempfile.gettempdir(), 'fintrack-nav-history'))
+nav_history = NavHistoryStore(NAV_HISTORY_DIR, mf_client)
+
+# Every AMFI scheme, for search by name, from the daily NAVAll.txt
+class SchemeIndex:
+    """AMFI schemes and their latest published NAVs, held in parallel arrays.
+
+    Loaded on first use from a NAVAll.txt snapshot, which is semicolon
+    separated with fund house and category heading lines between the
+    schemes. Schemes are ordered by name length then name, so walking a
+    posting list in index order yields the best-ranked (shortest) names first.
+    ``postings`` maps each word of the scheme names to an array of indexes
+    and ``vocabulary`` is the sorted word list for prefix lookups. The
+    snapshot is downloaded again in the background once older than
+    ``max_age``.
+    """
+    TOKEN_RE = re.compile(r'[a-z0-9&]+')
+    RETRY_AFTER = 600
+
+    def __init__(self, path, url, max_age=24 * 3600):
+        self.path = path
+        self.url = url
+        self.max_age = max_age
+        self.codes = []
+        self.names = []
+        self.houses = []
+        self.house_ids = array('i')
+        self.navs = array('d')
+        self.nav_dates = array('i')
+        self.index = {}
+        self.postings = {}
+        self.vocabulary = []
+        self.loaded_mtime = None
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.refreshing = False
+        self.last_attempt = 0.0
+        self.refreshes = 0
+
+    def __len__(self):
+        return len(self.codes)
+
+    def load(self):
+        """Parse the snapshot and swap it in; returns the number of schemes"""
+        mtime = os.path.getmtime(self.path)
+        schemes = []
+        house = ''
+        dates = {}
+        with open(self.path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                fields = line.split(';')
+                if len(fields) < 6:
+                    # Category headings read 'Open Ended Schemes(...)'; other lines name the fund house
+                    if 'Schemes' not in line:
+                        house = line
+                    continue
+                code = fields[0].strip()
+                if not code.isdigit():
+                    continue
+                try:
+                    nav = float(fields[4])
+                except ValueError:
+                    nav = math.nan
+                published = fields[5].strip()
+                if published not in dates:
+                    try:
+                        dates[published] = datetime.strptime(published, '%d-%b-%Y').date().toordinal()
+                    except ValueError:
+                        dates[published] = 0
+                name = fields[3].strip()
+                schemes.append((len(name), name, code, house, nav, dates[published]))
+        schemes.sort()
+
+        codes, names, houses = [], [], {}
+        house_ids, navs, nav_dates = array('i'), array('d'), array('i')
+        postings = {}
+        for i, (_, name, code, house, nav, ordinal) in enumerate(schemes):
+            codes.append(code)
+            names.append(name)
+            house_ids.append(houses.setdefault(house, len(houses)))
+            navs.append(nav)
+            nav_dates.append(ordinal)
+            for token in set(self.TOKEN_RE.findall(name.lower())):
+                postings.setdefault(token, array('i')).append(i)
+
+        with self.lock:
+            self.codes, self.names, self.houses = codes, names, list(houses)
+            self.house_ids, self.navs, self.nav_dates = house_ids, navs, nav_dates
+            self.index = {code: i for i, code in enumerate(codes)}
+            self.postings = postings
+            self.vocabulary = sorted(postings)
+            self.loaded_mtime = mtime
+        logger.info("Loaded %s mutual fund schemes from %s", len(codes), self.path)
+        return len(codes)
+
+    def ensure_fresh(self):
+        """Load the snapshot if it changed on disk, and refresh it in the background once stale"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != self.loaded_mtime:
+            with self.load_lock:
+                if mtime != self.loaded_mtime:
+                    try:
+                        self.load()
+                    except (OSError, ValueError) as e:
+                        logger.warning("Could not load scheme snapshot %s: %s", self.path, e)
+        if mtime is None or time.time() - mtime > self.max_age:
+            with self.lock:
+                if self.refreshing or time.time() - self.last_attempt < self.RETRY_AFTER:
+                    return
+                self.refreshing = True
+                self.last_attempt = time.time()
+            threading.Thread(target=self._refresh, name='scheme-index', daemon=True).start()
+
+    def is_fresh(self):
+        return self.loaded_mtime is not None and time.time() - self.loaded_mtime <= self.max_age
+
+    def _refresh(self):
+        started = time.perf_counter()
+        partial = self.path + '.partial'
+        try:
+            with mf_client.session.get(self.url, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                with open(partial, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        f.write(chunk)
+            os.replace(partial, self.path)
+            self.refreshes += 1
+            self.ensure_fresh()
+        except (requests.RequestException, OSError) as e:
+            upstream_errors.inc('amfi', 'error')
+            logger.warning("Could not refresh scheme snapshot from %s: %s", self.url, e)
+        finally:
+            upstream_latency.observe(time.perf_counter() - started, 'amfi')
+            with self.lock:
+                self.refreshing = False
+
+    def _entry(self, i):
+        nav = self.navs[i]
+        ordinal = self.nav_dates[i]
+        return {
+            'scheme_code': self.codes[i],
+            'scheme_name': self.names[i],
+            'fund_house': self.houses[self.house_ids[i]],
+            # Same formats as the mfapi-backed NAV responses
+            'nav': None if math.isnan(nav) else f'{nav:.4f}',
+            'date': date.fromordinal(ordinal).strftime('%d-%m-%Y') if ordinal else None
+        }
+
+    def lookup(self, scheme_code):
+        with self.lock:
+            i = self.index.get(scheme_code)
+            return None if i is None else self._entry(i)
+
+    def search(self, query, limit=10):
+        """Rank matches: exact scheme code, then names with every query word, shortest first.
+
+        Every word but the last must appear whole in the name; the last may
+        be partial, as while typing. The walk starts from whichever is
+        shorter, the rarest whole word's list or the lists of words the last
+        one prefixes, and stops after ``limit`` matches.
+        """
+        tokens = self.TOKEN_RE.findall(query.lower())
+        matches = []
+        seen = set()
+        with self.lock:
+            def add(i):
+                if i not in seen and len(matches) < limit:
+                    seen.add(i)
+                    matches.append(i)
+
+            if query.strip() in self.index:
+                add(self.index[query.strip()])
+            if not tokens:
+                return [self._entry(i) for i in matches]
+
+            *whole, last = tokens
+            required = [self.postings.get(token) for token in whole]
+            start = bisect.bisect_left(self.vocabulary, last)
+            end = bisect.bisect_left(self.vocabulary, last + '\uffff', start)
+            prefixed = [self.postings[token] for token in self.vocabulary[start:end]]
+            if not all(required) or not prefixed:
+                return [self._entry(i) for i in matches]
+            required.sort(key=len)
+
+            if not required or sum(map(len, prefixed)) <= len(required[0]):
+                for i in heapq.merge(*prefixed):
+                    if len(matches) >= limit:
+                        break
+                    if all(_sorted_contains(postings, i) for postings in required):
+                        add(i)
+            else:
+                for i in required[0]:
+                    if len(matches) >= limit:
+                        break
+                    if all(_sorted_contains(postings, i) for postings in required[1:]) and self._has_prefix(i, last, prefixed):
+                        add(i)
+            return [self._entry(i) for i in matches]
+
+    def _has_prefix(self, i, prefix, prefixed):
+        if len(prefixed) <= 16:
+            return any(_sorted_contains(postings, i) for postings in prefixed)
+        return any(token.startswith(prefix) for token in self.TOKEN_RE.findall(self.names[i].lower()))
+
+    def stats(self):
+        return {
+            'schemes': len(self.codes),
+            'loaded_mtime': self.loaded_mtime,
+            'refreshing': self.refreshing,
+            'refreshes': self.refreshes
+        }
+
+def _sorted_contains(values, value):
+    i = bisect.bisect_left(values, value)
+    return i < len(values) and values[i] == value
+
+AMFI_NAV_URL = os.getenv('AMFI_NAV_URL', 'https://www.amfiindia.com/spages/NAVAll.txt')
+AMFI_SCHEME_FILE = os.getenv('AMFI_SCHEME_FILE', os.path.join(tempfile.gettempdir(), 'fintrack-amfi-navall.txt'))
+scheme_index = SchemeIndex(AMFI_SCHEME_FILE, AMFI_NAV_URL, max_age=int(os.getenv('AMFI_SCHEME_MAX_AGE', '86400')))
+
+# Trailing windows reported by /api/mutual-fund/returns, in days
+RETURN_PERIODS = {'1m': 30, '3m': 91, '6m': 182, '1y': 365, '3y': 1095, '5y': 1826, '10y': 3652}
 
 def get_stock_info(symbol):
     """Use yfinance to fetch stock data for NSE and BSE stocks"""
     # Make sure symbol has proper extension
     if not (symbol.endswith('.NS') or symbol.endswith('.BO')):
         symbol = f"{symbol}.NS"  # Default to NSE
-    
+    return stock_fetches.do(('info', symbol), _fetch_stock_info, symbol)
+
+def _fetch_stock_info(symbol):
+    """Fetch a single quote from yfinance; called once per in-flight symbol"""
     # Get base symbol without extension
     base_symbol = symbol.split('.')[0]
-    
-    # In production or if we have fallback data for this stock, use it to avoid API limits
-    is_production = os.getenv('VERCEL_ENV') == 'production' or os.getenv('PRODUCTION') == 'true'
-    if is_production or base_symbol in FALLBACK_STOCKS:
-        if base_symbol in FALLBACK_STOCKS:
-            print(f"Using static fallback data for {base_symbol}")
-            return {
-                'success': True,
-                'symbol': base_symbol,
-                'company_name': FALLBACK_STOCKS[base_symbol]['company_name'],
-                'current_price': FALLBACK_STOCKS[base_symbol]['current_price'],
-                'change': FALLBACK_STOCKS[base_symbol]['change']
-            }
-    
-    # If we're here, attempt to get data from yfinance
+
+    # Attempt to get data from yfinance
     try:
-        # Add a small delay to avoid rate limiting
-        time.sleep(random.uniform(0.1, 0.3))
-        
         # Get stock info using yfinance with error handling
         try:
-            ticker = yf.Ticker(symbol)
+            provider = market_data()
             
             # Try fetching the info (sometimes this can fail)
             try:
-                info = ticker.info
+                info = call_yahoo('yfinance_info', provider.quote_info, symbol)
                 
                 # Check if we got valid data
                 if isinstance(info, dict) and 'longName' in info and 'regularMarketPrice' in info:
@@ -223,24 +1352,25 @@ def get_stock_info(symbol):
                         'symbol': base_symbol,
                         'company_name': info.get('longName', base_symbol),
                         'current_price': round(price, 2),
-                        'change': round(change, 2)
+                        'change': round(change, 2),
+                        'source': 'live'
                     }
+            except UpstreamUnavailable:
+                # No point trying history while upstream is throttled or down
+                raise
             except Exception as inner_error:
-                print(f"Inner error fetching info for {symbol}: {str(inner_error)}")
+                logger.warning("Inner error fetching info for %s: %s", symbol, inner_error)
             
             # Try using history as an alternative approach
             try:
-                history = ticker.history(period="2d")
-                if not history.empty and len(history) > 0:
+                closes = call_yahoo('yfinance_history', provider.daily_closes, symbol, period="2d")
+                if closes:
                     # Calculate change from the history data
-                    latest = history.iloc[-1]
-                    if len(history) > 1:
-                        prev_day = history.iloc[-2]
-                        price = latest.get('Close', 0)
-                        prev_price = prev_day.get('Close', price)
+                    price = closes[-1]
+                    if len(closes) > 1:
+                        prev_price = closes[-2]
                         change = ((price - prev_price) / prev_price * 100) if prev_price and prev_price > 0 else 0
                     else:
-                        price = latest.get('Close', 0)
                         change = 0
                     
                     return {
@@ -248,119 +1378,1602 @@ def get_stock_info(symbol):
                         'symbol': base_symbol,
                         'company_name': f"{base_symbol} Stock", # Fallback name
                         'current_price': round(price, 2),
-                        'change': round(change, 2)
+                        'change': round(change, 2),
+                        'source': 'live'
                     }
+            except UpstreamUnavailable:
+                raise
             except Exception as history_error:
-                print(f"History fallback error for {symbol}: {str(history_error)}")
+                logger.warning("History fallback error for %s: %s", symbol, history_error)
                 
+        except UpstreamUnavailable as unavailable:
+            logger.debug("Skipping Yahoo Finance for %s: %s", symbol, unavailable)
         except Exception as ticker_error:
-            print(f"Ticker creation error for {symbol}: {str(ticker_error)}")
+            logger.warning("Ticker creation error for %s: %s", symbol, ticker_error)
             
-        # If all yfinance methods failed, check for fallback data again
-        if base_symbol in FALLBACK_STOCKS:
-            print(f"YFinance failed, using fallback data for {base_symbol}")
-            return {
-                'success': True,
-                'symbol': base_symbol,
-                'company_name': FALLBACK_STOCKS[base_symbol]['company_name'],
-                'current_price': FALLBACK_STOCKS[base_symbol]['current_price'],
-                'change': FALLBACK_STOCKS[base_symbol]['change']
-            }
-                
         # If we reach here, we couldn't get data    
-        print(f"No data available for {symbol}")
+        logger.debug("No data available for %s", symbol)
         return {'success': False, 'error': 'Could not fetch stock data'}
             
     except Exception as e:
-        print(f"Error fetching stock data for {symbol}: {str(e)}")
+        logger.warning("Error fetching stock data for %s: %s", symbol, e)
         return {'success': False, 'error': str(e)}
 
-# Enhanced stock data fetching with better error handling
+# Quote providers, tried in order until one answers
+class QuoteProvider:
+    """One tier of the quote fallback chain.
+
+    ``quote`` returns a quote dict (tagged with the tier in ``source``) or
+    None; ``quote_many`` returns a dict holding only the symbols it answered.
+    ``timeout`` is the time left in the caller's budget, None for no limit.
+    """
+    name = None
+
+    def quote(self, symbol, timeout=None):
+        raise NotImplementedError
+
+    def quote_many(self, symbols, timeout=None):
+        results = {}
+        for symbol in symbols:
+            quote = self.quote(symbol, timeout)
+            if quote:
+                results[symbol] = quote
+        return results
+
+    def stats(self):
+        return {}
+
+class LiveQuoteProvider(QuoteProvider):
+    """Yahoo Finance quotes with hedged requests.
+
+    Calls run on a dedicated pool so a caller can stop waiting at its
+    deadline while the fetch carries on and fills the cache for the next
+    request. Once a call has run longer than the recent p95 latency of its
+    kind, one duplicate is started and whichever answers first wins.
+    """
+    name = 'live'
+
+    def __init__(self, cache, pool_size=8, window=200, min_samples=20, min_hedge_delay=0.05):
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='live-quote')
+        self.min_samples = min_samples
+        self.min_hedge_delay = min_hedge_delay
+        # Recent successful call durations, per kind of call
+        self.latency = {'quote': deque(maxlen=window), 'batch': deque(maxlen=window)}
+        self.lock = threading.Lock()
+        self.counters = {'calls': 0, 'hedges': 0, 'hedge_wins': 0, 'deadline_misses': 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def hedge_delay(self, kind):
+        """The p95 of recent calls of this kind, or None until there are enough samples"""
+        with self.lock:
+            samples = sorted(self.latency[kind])
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_hedge_delay, samples[int(0.95 * (len(samples) - 1))])
+
+    def _timed(self, kind, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        if result:
+            with self.lock:
+                self.latency[kind].append(time.perf_counter() - started)
+        return result
+
+    def _hedged(self, kind, timeout, fn, *args):
+        """Return the first truthy fn(*args) from the primary or its hedge, or None at the deadline"""
+        self._count('calls')
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        futures = {self.pool.submit(self._timed, kind, fn, *args): 'primary'}
+
+        delay = self.hedge_delay(kind)
+        if delay is not None and (deadline is None or started + delay < deadline):
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self._count('hedges')
+                futures[self.pool.submit(self._timed, kind, fn, *args)] = 'hedge'
+
+        pending = set(futures)
+        while pending:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                self._count('deadline_misses')
+                return None
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning("Live quote call failed: %s", e)
+                    continue
+                if result:
+                    if futures[future] == 'hedge':
+                        self._count('hedge_wins')
+                    return result
+        return None
+
+    def quote(self, symbol, timeout=None):
+        # Another request may have filled the cache while we waited
+        entry = self.cache.get_entry(symbol)
+        if entry and time.time() < entry[2]:
+            return entry[0]
+        return self._hedged('quote', timeout, self._fetch, symbol)
+
+    def quote_many(self, symbols, timeout=None):
+        return self._hedged('batch', timeout, _fetch_stock_data_many, symbols) or {}
+
+    def _fetch(self, symbol):
+        """Price the requested (or default NSE) listing, then BSE; cache and return the quote or None"""
+        yahoo_symbol = _to_yahoo_symbol(symbol)
+        logger.debug("Fetching data for %s from Yahoo Finance", yahoo_symbol)
+        result = _fetch_stock_info(yahoo_symbol)
+
+        # If NSE fails, try BSE (unless upstream has just been cut off)
+        if not result['success'] and yahoo_symbol.endswith('.NS') and yahoo_breaker.stats()['state'] != 'open':
+            logger.debug("NSE failed, trying BSE for %s", symbol)
+            result = _fetch_stock_info(f"{symbol.split('.')[0]}.BO")
+        if not result['success']:
+            return None
+        self.cache.set(symbol, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        for kind in self.latency:
+            delay = self.hedge_delay(kind)
+            counters[f'{kind}_hedge_after_ms'] = None if delay is None else round(delay * 1000, 1)
+        return counters
+
+class StaleQuoteProvider(QuoteProvider):
+    """The last live quote still held by the cache, however old"""
+    name = 'stale'
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def quote(self, symbol, timeout=None):
+        stale_data = self.cache.get_stale(symbol)
+        return dict(stale_data, source=self.name) if stale_data else None
+
+class StaticQuoteProvider(QuoteProvider):
+    """Bundled snapshot prices for common symbols"""
+    name = 'static'
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def quote(self, symbol, timeout=None):
+        data = self.snapshot.get(symbol.split('.')[0])
+        return dict(data, success=True, source=self.name) if data else None
+
+class QuoteChain:
+    """Ask each provider in turn within one deadline; the first answer wins.
+
+    A symbol no tier can price gets a ``{'success': False}`` entry rather
+    than made-up numbers. Answers from after the first (live) tier, and
+    unavailable entries, are kept in ``fallbacks`` for ``fallback_ttl``
+    seconds, so during an outage each symbol costs one live attempt per TTL
+    rather than one per request.
+    """
+    def __init__(self, providers, timeout, fallback_ttl=60):
+        self.providers = providers
+        self.timeout = timeout
+        self.fallbacks = TTLCache(max_entries=1024, default_ttl=fallback_ttl)
+        self.answers = {provider.name: 0 for provider in providers}
+        self.answers['unavailable'] = 0
+
+    def record(self, provider):
+        """Count an answer from provider (approximate under contention, like TTLCache's counters)"""
+        self._count(provider.name)
+
+    def _count(self, tier):
+        self.answers[tier] += 1
+        if tier not in ('live', 'unavailable'):
+            fallback_used.inc('stock', tier)
+
+    def _cached_fallback(self, symbol):
+        cached = self.fallbacks.get(symbol)
+        if cached:
+            self._count(cached['source'] or 'unavailable')
+        return cached
+
+    @staticmethod
+    def unavailable(symbol):
+        return {'success': False, 'symbol': symbol.split('.')[0], 'error': 'Could not fetch stock data', 'source': None}
+
+    def quote(self, symbol, timeout=None, providers=None):
+        cached = self._cached_fallback(symbol)
+        if cached:
+            return cached
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        for provider in providers or self.providers:
+            result = provider.quote(symbol, max(0, deadline - time.monotonic()))
+            if result:
+                self.record(provider)
+                if provider is not self.providers[0]:
+                    self.fallbacks.set(symbol, result)
+                return result
+        self._count('unavailable')
+        result = self.unavailable(symbol)
+        self.fallbacks.set(symbol, result)
+        return result
+
+    def quote_many(self, symbols, timeout=None):
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        results = {}
+        remaining = []
+        for symbol in dict.fromkeys(symbols):
+            cached = self._cached_fallback(symbol)
+            if cached:
+                results[symbol] = cached
+            else:
+                remaining.append(symbol)
+        for provider in self.providers:
+            if not remaining:
+                break
+            for symbol, result in provider.quote_many(remaining, max(0, deadline - time.monotonic())).items():
+                results[symbol] = result
+                self.record(provider)
+                if provider is not self.providers[0]:
+                    self.fallbacks.set(symbol, result)
+            remaining = [symbol for symbol in remaining if symbol not in results]
+        for symbol in remaining:
+            self._count('unavailable')
+            results[symbol] = self.unavailable(symbol)
+            self.fallbacks.set(symbol, results[symbol])
+        return results
+
+    def fallback(self, symbol):
+        """Answer from the tiers after live only, for callers whose budget is already spent"""
+        return self.quote(symbol, providers=self.providers[1:])
+
+    def stats(self):
+        return {
+            'answers': dict(self.answers),
+            **{provider.name: provider.stats() for provider in self.providers if provider.stats()}
+        }
+
+# Time budget for the live tier of one quote request, before falling back
+QUOTE_DEADLINE = float(os.getenv('QUOTE_DEADLINE', '3'))
+
+live_quotes = LiveQuoteProvider(stock_cache, pool_size=int(os.getenv('QUOTE_POOL_SIZE', '8')))
+stale_quotes = StaleQuoteProvider(stock_cache)
+static_quotes = StaticQuoteProvider(FALLBACK_STOCKS)
+# Seconds a fallback answer is reused before the live tier is tried again
+FALLBACK_QUOTE_TTL = float(os.getenv('FALLBACK_QUOTE_TTL', '60'))
+quote_chain = QuoteChain([live_quotes, stale_quotes, static_quotes], QUOTE_DEADLINE, FALLBACK_QUOTE_TTL)
+
 def get_stock_data(symbol):
-    """API endpoint to get stock data with improved caching and rate limiting"""
+    """Quote for one symbol: fresh cache, else stale-while-revalidate, else the provider chain"""
     # Check cache first
     cached_data = stock_cache.get(symbol)
     if cached_data:
-        print(f"Cache hit for {symbol}")
+        logger.debug("Cache hit for %s", symbol)
         return cached_data
-        
-    base_symbol = symbol.split('.')[0]
-    
-    # Check if we're in production - use multiple indicators
-    is_production = os.getenv('VERCEL_ENV') == 'production' or os.getenv('PRODUCTION') == 'true'
-    
-    # In production, prioritize fallback data to avoid rate limits entirely
-    if is_production and base_symbol in FALLBACK_STOCKS:
-        print(f"Production mode: using fallback data for {base_symbol}")
-        result = FALLBACK_STOCKS[base_symbol].copy()
-        result['success'] = True
-        # Still cache this result
-        stock_cache.set(symbol, result)
-        return result
-    
-    # For common Indian stocks, always use fallback data even in development
-    if base_symbol in FALLBACK_STOCKS:
-        print(f"Using fallback data for common stock: {base_symbol}")
-        result = FALLBACK_STOCKS[base_symbol].copy()
-        result['success'] = True
-        # Cache this result
-        stock_cache.set(symbol, result) 
-        return result
-    
-    # Try to get real data using yfinance only if we don't have fallback data
+
+    # Stale-while-revalidate: answer from the stale tier right away and
+    # let a background thread refresh it
+    stale_data = stale_quotes.quote(symbol)
+    if stale_data:
+        stock_cache.refresh_async(('data', symbol), _refresh_stock_data, symbol)
+        quote_chain.record(stale_quotes)
+        return stale_data
+
+    # Concurrent misses for the same symbol share one pass through the chain
+    return stock_fetches.do(('data', symbol), quote_chain.quote, symbol)
+
+def _refresh_stock_data(symbol):
+    return stock_fetches.do(('refresh', symbol), live_quotes.quote, symbol)
+
+# Local NSE/BSE symbol master for validation and autocomplete
+class SymbolMaster:
+    """Symbols and company names from CSV snapshots, held as sorted arrays.
+
+    ``symbols`` is sorted with ``names`` and ``exchanges`` in parallel, so
+    symbol prefixes are a bisect; ``name_tokens`` is a sorted list of
+    (word, index) pairs for prefix search on any word of the company name.
+    Lookups never touch the network.
+    """
+    SYMBOL_COLUMNS = ('symbol', 'SYMBOL', 'Security Id')
+    NAME_COLUMNS = ('company_name', 'NAME OF COMPANY', 'Security Name', 'Issuer Name')
+    TOKEN_RE = re.compile(r'[a-z0-9&]+')
+
+    def __init__(self):
+        self.symbols = []
+        self.names = []
+        self.exchanges = []
+        self.index = {}
+        self.name_tokens = []
+
+    def load(self, paths):
+        """Load (path, default_exchange) pairs; a symbol listed on both exchanges keeps both"""
+        entries = {}
+        for path, default_exchange in paths:
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as f:
+                    for row in csv.DictReader(f):
+                        row = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+                        symbol = next((row[c] for c in self.SYMBOL_COLUMNS if row.get(c)), '').upper()
+                        if not symbol:
+                            continue
+                        name = next((row[c] for c in self.NAME_COLUMNS if row.get(c)), symbol)
+                        exchange = (row.get('exchange') or default_exchange).upper()
+                        entry = entries.setdefault(symbol, [name, set()])
+                        entry[1].add(exchange)
+            except OSError as e:
+                logger.warning("Could not load symbol master %s: %s", path, e)
+
+        self.symbols = sorted(entries)
+        self.names = [entries[symbol][0] for symbol in self.symbols]
+        # NSE first so resolution prefers it
+        self.exchanges = [tuple(sorted(entries[symbol][1], key=lambda e: e != 'NS')) for symbol in self.symbols]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.name_tokens = sorted(
+            (token, i)
+            for i, name in enumerate(self.names)
+            for token in set(self.TOKEN_RE.findall(name.lower()))
+        )
+        return len(self.symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _entry(self, i):
+        return {
+            'symbol': self.symbols[i],
+            'company_name': self.names[i],
+            'exchanges': list(self.exchanges[i])
+        }
+
+    def lookup(self, symbol):
+        i = self.index.get(symbol.upper().split('.')[0])
+        return None if i is None else self._entry(i)
+
+    def resolve_exchange(self, symbol):
+        """Return the preferred exchange suffix ('NS' or 'BO') for a known symbol, else None"""
+        i = self.index.get(symbol.upper().split('.')[0])
+        return None if i is None else self.exchanges[i][0]
+
+    def company_name(self, symbol, default=None):
+        i = self.index.get(symbol.upper().split('.')[0])
+        return default if i is None else self.names[i]
+
+    def search(self, query, limit=10):
+        """Rank matches: exact symbol, symbol prefix, company-name word prefix.
+
+        Only when none of those match is a fuzzy pass run, over symbols that
+        share the query's first two letters. An explicit '.NS' or '.BO'
+        suffix is kept on every result rather than resolved again.
+        """
+        query = query.strip()
+        if not query or not self.symbols:
+            return []
+        upper = query.upper()
+        suffix = None
+        if upper.endswith(('.NS', '.BO')):
+            upper, suffix = upper[:-3], upper[-2:]
+            query = query[:-3]
+        matches = []
+        seen = set()
+
+        def add(i):
+            if i not in seen and len(matches) < limit:
+                seen.add(i)
+                matches.append(i)
+
+        if upper in self.index:
+            add(self.index[upper])
+
+        start = bisect.bisect_left(self.symbols, upper)
+        for i in range(start, len(self.symbols)):
+            if len(matches) >= limit or not self.symbols[i].startswith(upper):
+                break
+            add(i)
+
+        tokens = self.TOKEN_RE.findall(query.lower())
+        if tokens and len(matches) < limit:
+            # Match on the last (possibly partial) word, require the others to be present
+            prefix, others = tokens[-1], tokens[:-1]
+            start = bisect.bisect_left(self.name_tokens, (prefix, -1))
+            for j in range(start, len(self.name_tokens)):
+                token, i = self.name_tokens[j]
+                if len(matches) >= limit or not token.startswith(prefix):
+                    break
+                name = self.names[i].lower()
+                if all(other in name for other in others):
+                    add(i)
+
+        if not matches and len(upper) >= 3 and ' ' not in upper:
+            start = bisect.bisect_left(self.symbols, upper[:2])
+            end = bisect.bisect_left(self.symbols, upper[:2] + '\uffff', start)
+            for symbol in difflib.get_close_matches(upper, self.symbols[start:end], n=limit, cutoff=0.75):
+                add(self.index[symbol])
+
+        results = [self._entry(i) for i in matches]
+        if suffix:
+            for result in results:
+                result['symbol'] = f"{result['symbol']}.{suffix}"
+                result['exchanges'] = [suffix]
+        return results
+
+def _symbol_master_paths():
+    """Parse SYMBOL_MASTER_FILES ('path[:EXCHANGE],...'), defaulting to the bundled snapshot"""
+    configured = os.getenv('SYMBOL_MASTER_FILES')
+    if not configured:
+        return [(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symbols.csv'), 'NS')]
+    paths = []
+    for item in configured.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, exchange = item.rpartition(':') if item.upper().endswith((':NS', ':BO')) else (item, '', 'NS')
+        paths.append((path, exchange.upper()))
+    return paths
+
+symbol_master = SymbolMaster()
+symbol_master.load(_symbol_master_paths())
+
+# Upper bound on symbols accepted by a single batch request
+MAX_BATCH_SYMBOLS = 100
+
+def _to_yahoo_symbol(symbol, exchange='NS'):
+    """Return the Yahoo Finance ticker for a symbol, defaulting to the given exchange"""
+    if symbol.endswith('.NS') or symbol.endswith('.BO'):
+        return symbol
+    return f"{symbol}.{exchange}"
+
+def _quote_from_closes(base_symbol, closes):
+    """Build a quote dict from a list of daily closes (oldest first)"""
+    if not closes:
+        return None
+    price = closes[-1]
+    prev_price = closes[-2] if len(closes) > 1 else price
+    change = ((price - prev_price) / prev_price * 100) if prev_price > 0 else 0
+    return {
+        'success': True,
+        'symbol': base_symbol,
+        # download() carries no names, so take them from the symbol master
+        'company_name': symbol_master.company_name(base_symbol, f"{base_symbol} Stock"),
+        'current_price': round(price, 2),
+        'change': round(change, 2),
+        'source': 'live'
+    }
+
+def _download_quotes(yahoo_symbols):
+    """Fetch daily closes for many tickers in one yfinance round-trip.
+
+    Returns a dict mapping each Yahoo ticker that produced data to its quote.
+    """
+    if not yahoo_symbols:
+        return {}
+
+    # A few days of history covers weekends and exchange holidays
+    closes = call_yahoo('yfinance_download', market_data().download_daily_closes, yahoo_symbols, period="5d")
+
+    quotes = {}
+    for yahoo_symbol, symbol_closes in closes.items():
+        quote = _quote_from_closes(yahoo_symbol.split('.')[0], symbol_closes)
+        if quote:
+            quotes[yahoo_symbol] = quote
+    return quotes
+
+def get_stock_data_many(symbols, timeout=None):
+    """Fetch stock data for many symbols, downloading all cache misses in one request.
+
+    Returns a dict keyed by the requested symbol. Misses go through
+    quote_chain in one batch, whose live tier waits at most ``timeout``
+    seconds (QUOTE_DEADLINE by default); symbols no tier could price map to
+    a ``{'success': False}`` entry.
+    """
+    results = {}
+    misses = []
+    stale_symbols = []
+
+    for symbol in symbols:
+        if symbol in results:
+            continue
+        cached_data = stock_cache.get(symbol)
+        if cached_data:
+            results[symbol] = cached_data
+            continue
+
+        stale_data = stale_quotes.quote(symbol)
+        if stale_data:
+            quote_chain.record(stale_quotes)
+            results[symbol] = stale_data
+            stale_symbols.append(symbol)
+            continue
+
+        misses.append(symbol)
+
+    # Expired quotes are served as-is and refreshed together in the background
+    if stale_symbols:
+        stock_cache.refresh_async(('batch', tuple(sorted(stale_symbols))), _fetch_stock_data_many, stale_symbols)
+
+    if not misses:
+        return results
+
+    results.update(quote_chain.quote_many(misses, timeout))
+    return results
+
+def _download_symbol_quotes(symbols):
+    """Download and cache live quotes for symbols, trying NSE then BSE.
+
+    Returns a dict holding only the symbols that were priced; upstream
+    errors (including UpstreamUnavailable) propagate to the caller.
+    """
+    # Try the requested (or default NSE) listing first, then retry
+    # anything unpriced on BSE in a second batched call
+    pending = {symbol: _to_yahoo_symbol(symbol) for symbol in symbols}
+    quotes = _download_quotes(sorted(set(pending.values())))
+
+    retry = {
+        symbol: f"{symbol.split('.')[0]}.BO"
+        for symbol, yahoo_symbol in pending.items()
+        if yahoo_symbol not in quotes and yahoo_symbol.endswith('.NS')
+    }
+    if retry:
+        quotes.update(_download_quotes(sorted(set(retry.values()))))
+        pending.update(retry)
+
+    results = {}
+    for symbol, yahoo_symbol in pending.items():
+        if yahoo_symbol in quotes:
+            stock_cache.set(symbol, quotes[yahoo_symbol])
+            results[symbol] = quotes[yahoo_symbol]
+    return results
+
+def _fetch_stock_data_many(symbols):
+    """Download quotes for symbols in batched yfinance calls and cache them.
+
+    Returns a dict holding only the symbols that were priced.
+    """
+    logger.debug("Batch fetching %s symbols from Yahoo Finance", len(symbols))
     try:
-        # Add randomized delay to prevent rate limiting
-        time.sleep(random.uniform(0.2, 0.5))
-        
-        # Format symbol properly for Yahoo Finance
-        if not (symbol.endswith('.NS') or symbol.endswith('.BO')):
-            yahoo_symbol = f"{symbol}.NS"  # Default to NSE
-        else:
-            yahoo_symbol = symbol
-            
-        print(f"Fetching data for {yahoo_symbol} from Yahoo Finance")
-        result = get_stock_info(yahoo_symbol)
-        
-        # Cache successful results
-        if result['success']:
-            stock_cache.set(symbol, result)
-            return result
-            
-        # If NSE fails, try BSE
-        if yahoo_symbol.endswith('.NS'):
-            bse_symbol = f"{base_symbol}.BO"
-            print(f"NSE failed, trying BSE: {bse_symbol}")
-            time.sleep(random.uniform(0.2, 0.5))  # Additional delay
-            result = get_stock_info(bse_symbol)
-            if result['success']:
-                stock_cache.set(symbol, result)
-                return result
-    
+        return _download_symbol_quotes(symbols)
     except Exception as e:
-        print(f"Error fetching stock data for {symbol}: {str(e)}")
-        # Try to get stale data from cache
-        stale_data = stock_cache.get_stale(symbol)
-        if stale_data:
-            print(f"Using stale data for {symbol}")
-            return stale_data
-    
-    # Last resort: return generated data
-    print(f"Generating fallback data for {symbol}")
-    generated_data = {
-        "success": True,
-        "symbol": base_symbol,
-        "company_name": f"{base_symbol} Stock",
-        "current_price": round(random.uniform(500, 3000), 2),
-        "change": round(random.uniform(-2, 2), 2)
+        logger.warning("Error batch fetching stock data: %s", e)
+        return {}
+
+# Bounded pool for fanning out per-symbol lookups inside one request
+quote_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('QUOTE_POOL_SIZE', '8')),
+    thread_name_prefix='quote'
+)
+# Time budget for all upstream lookups made while rendering one page
+PAGE_FETCH_DEADLINE = float(os.getenv('PAGE_FETCH_DEADLINE', '5'))
+
+def resolve_listings(symbols, timeout=PAGE_FETCH_DEADLINE):
+    """Race the NSE and BSE lookups for many bare symbols under one deadline.
+
+    Returns a dict mapping each symbol that resolved to (yahoo_symbol,
+    stock_info) for its first valid listing. Symbols with no valid answer
+    before the deadline are left out, and lookups still queued then are
+    cancelled so they do not hold quote_pool for other requests.
+    """
+    futures = {
+        quote_pool.submit(get_stock_info, f"{symbol}.{exchange}"): (symbol, f"{symbol}.{exchange}")
+        for symbol in dict.fromkeys(symbols)
+        for exchange in ('NS', 'BO')
     }
-    # Cache even the generated data
-    stock_cache.set(symbol, generated_data)
-    return generated_data
+    resolved = {}
+    deadline = time.monotonic() + timeout
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        # Prefer NSE when both finish together
+        for future in sorted(done, key=lambda f: not futures[f][1].endswith('.NS')):
+            symbol, yahoo_symbol = futures[future]
+            if symbol in resolved:
+                continue
+            try:
+                stock_info = future.result()
+            except Exception:
+                continue
+            if stock_info['success']:
+                resolved[symbol] = (yahoo_symbol, stock_info)
+                # The other exchange's lookup is no longer needed
+                for twin in pending:
+                    if futures[twin][0] == symbol:
+                        twin.cancel()
+    for future in pending:
+        future.cancel()
+    return resolved
 
-@app.route('/firebase-config')
-def firebase_config():
-    """Return Firebase configuration as JSON for client-side initialization"""
-    config = {
+# Opt-in background refresh of recently requested symbols
+class QuotePrefetcher:
+    """Keep recently requested quotes warm in stock_cache.
+
+    Symbols are recorded as users request them. While NSE/BSE are open a
+    daemon thread refreshes every symbol seen within the tracking window in
+    batched downloads on a fixed cadence; outside trading hours it sleeps
+    until the next session.
+    """
+    def __init__(self, interval=120, window=24 * 3600, max_symbols=500):
+        self.interval = interval
+        self.window = window
+        self.max_symbols = max_symbols
+        self.last_seen = OrderedDict()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.runs = 0
+        self.last_run = None
+
+    def track(self, symbols):
+        now = time.time()
+        with self.lock:
+            for symbol in symbols:
+                self.last_seen[symbol] = now
+                self.last_seen.move_to_end(symbol)
+            while len(self.last_seen) > self.max_symbols:
+                self.last_seen.popitem(last=False)
+
+    def tracked_symbols(self):
+        cutoff = time.time() - self.window
+        with self.lock:
+            for symbol in [s for s, seen in self.last_seen.items() if seen < cutoff]:
+                del self.last_seen[symbol]
+            return list(self.last_seen)
+
+    def refresh(self):
+        symbols = self.tracked_symbols()
+        for i in range(0, len(symbols), MAX_BATCH_SYMBOLS):
+            _fetch_stock_data_many(symbols[i:i + MAX_BATCH_SYMBOLS])
+        self.runs += 1
+        self.last_run = time.time()
+        return len(symbols)
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='quote-prefetcher', daemon=True)
+        self.thread.start()
+        logger.info("Quote prefetcher started (every %ss during market hours)", self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            wait = seconds_until_market_open()
+            if wait > 0:
+                # Wake up at the next open (re-checking at least hourly)
+                self.stop_event.wait(min(wait, 3600))
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Quote prefetch failed: %s", e)
+            self.stop_event.wait(self.interval)
+
+    def stats(self):
+        with self.lock:
+            tracked = len(self.last_seen)
+        return {
+            'running': self.thread is not None and self.thread.is_alive(),
+            'tracked_symbols': tracked,
+            'runs': self.runs,
+            'last_run': self.last_run
+        }
+
+quote_prefetcher = QuotePrefetcher(interval=int(os.getenv('QUOTE_PREFETCH_INTERVAL', '120')))
+if os.getenv('QUOTE_PREFETCH', 'false').lower() == 'true':
+    quote_prefetcher.start()
+
+# Fan-out of live prices to Server-Sent Events subscribers
+class PriceHub:
+    """Share one refresh loop between every price stream subscriber.
+
+    A single thread periodically prices the union of all subscribed symbols
+    through get_stock_data_many (so cache, stale-while-revalidate and batching
+    apply) and pushes only the quotes that changed to each subscriber's queue.
+    The thread exits when the last subscriber leaves.
+    """
+    def __init__(self, interval=15):
+        self.interval = interval
+        self.subscribers = {}
+        self.last_sent = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, symbols, snapshot=None):
+        subscriber = queue.Queue(maxsize=100)
+        with self.lock:
+            self.subscribers[subscriber] = set(symbols)
+            # The subscriber already holds these values; only push later changes
+            for symbol, compact in (snapshot or {}).items():
+                self.last_sent.setdefault(symbol, compact)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='price-hub', daemon=True)
+                self.thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.pop(subscriber, None)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    self.last_sent.clear()
+                    return
+                symbols = sorted(set().union(*self.subscribers.values()))
+            try:
+                self.publish(get_stock_data_many(symbols))
+            except Exception as e:
+                logger.warning("Price stream refresh failed: %s", e)
+            time.sleep(self.interval)
+
+    def publish(self, quotes):
+        changed = {}
+        with self.lock:
+            for symbol, quote in quotes.items():
+                if not quote.get('success'):
+                    continue
+                compact = [quote['current_price'], quote['change']]
+                if self.last_sent.get(symbol) != compact:
+                    self.last_sent[symbol] = compact
+                    changed[symbol] = compact
+            if not changed:
+                return
+            subscribers = list(self.subscribers.items())
+        for subscriber, symbols in subscribers:
+            delta = {symbol: changed[symbol] for symbol in symbols if symbol in changed}
+            if not delta:
+                continue
+            try:
+                subscriber.put_nowait(delta)
+            except queue.Full:
+                # Slow consumer; it will catch up on the next change
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'symbols': len(set().union(*self.subscribers.values())) if self.subscribers else 0
+            }
+
+price_hub = PriceHub(interval=int(os.getenv('PRICE_STREAM_INTERVAL', '15')))
+
+# Intraday price ticks, recorded from quotes as they land in stock_cache
+INTRADAY_INTERVALS = {'1m': 60, '5m': 300, '15m': 900}
+
+class TickRing:
+    """Fixed-size ring of (timestamp, price) ticks in two preallocated arrays.
+
+    Once full, each append overwrites the oldest tick, so memory stays at
+    ``capacity`` doubles per array however long the process runs.
+    """
+    __slots__ = ('times', 'prices', 'start', 'count', 'lock')
+
+    def __init__(self, capacity):
+        self.times = array('d', bytes(8 * capacity))
+        self.prices = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, price):
+        capacity = len(self.times)
+        with self.lock:
+            i = (self.start + self.count) % capacity
+            self.times[i] = timestamp
+            self.prices[i] = price
+            if self.count < capacity:
+                self.count += 1
+            else:
+                self.start = (self.start + 1) % capacity
+
+    def latest(self):
+        """Timestamp of the newest tick, or None if empty"""
+        with self.lock:
+            if not self.count:
+                return None
+            return self.times[(self.start + self.count - 1) % len(self.times)]
+
+    def ohlc(self, width, since=0.0):
+        """OHLC bars of ``width`` seconds over ticks at or after ``since``.
+
+        Returns parallel lists (bar start times, opens, highs, lows, closes),
+        oldest first, walking the ring in place rather than copying it.
+        """
+        starts, opens, highs, lows, closes = [], [], [], [], []
+        capacity = len(self.times)
+        bucket = None
+        with self.lock:
+            for k in range(self.count):
+                i = (self.start + k) % capacity
+                timestamp = self.times[i]
+                if timestamp < since:
+                    continue
+                price = self.prices[i]
+                bar_start = timestamp - timestamp % width
+                if bar_start != bucket:
+                    bucket = bar_start
+                    starts.append(int(bar_start))
+                    opens.append(price)
+                    highs.append(price)
+                    lows.append(price)
+                    closes.append(price)
+                else:
+                    if price > highs[-1]:
+                        highs[-1] = price
+                    if price < lows[-1]:
+                        lows[-1] = price
+                    closes[-1] = price
+        return starts, opens, highs, lows, closes
+
+class IntradayTicks:
+    """Per-symbol TickRings fed by every fresh quote stored in stock_cache.
+
+    Symbols are kept in LRU order and the least recently quoted one is
+    dropped beyond ``max_symbols``, so total memory is bounded too. The
+    stock_cache listener does one dict lookup and one ring append.
+    """
+    def __init__(self, capacity=1024, max_symbols=512):
+        self.capacity = capacity
+        self.max_symbols = max_symbols
+        self.rings = OrderedDict()
+        self.lock = threading.Lock()
+
+    def quote_updated(self, key, quote):
+        """stock_cache listener: append the quote's price as a tick"""
+        if not quote.get('success'):
+            return
+        symbol = quote['symbol']
+        with self.lock:
+            ring = self.rings.get(symbol)
+            if ring is None:
+                ring = self.rings[symbol] = TickRing(self.capacity)
+                if len(self.rings) > self.max_symbols:
+                    self.rings.popitem(last=False)
+            else:
+                self.rings.move_to_end(symbol)
+        ring.append(time.time(), quote['current_price'])
+
+    def bars(self, symbol, width):
+        """OHLC bars for the IST trading day of the symbol's newest tick, or None if never quoted"""
+        with self.lock:
+            ring = self.rings.get(symbol)
+        if ring is None:
+            return None
+        latest = ring.latest()
+        if latest is None:
+            return None
+        day = datetime.fromtimestamp(latest, IST).date()
+        return ring.ohlc(width, since=datetime.combine(day, dt_time(0, 0), IST).timestamp())
+
+    def stats(self):
+        with self.lock:
+            return {'symbols': len(self.rings), 'capacity': self.capacity}
+
+intraday_ticks = IntradayTicks(capacity=int(os.getenv('INTRADAY_TICKS', '1024')))
+stock_cache.listeners.append(intraday_ticks.quote_updated)
+
+class SQLiteStore:
+    """Base for SQLite-backed stores of user data.
+
+    Like PersistentCache, the database runs in WAL mode with one connection
+    per thread, but errors propagate: this is primary data, not a cache.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _write(self, sql, rows):
+        """executemany in one transaction; returns the number of rows changed"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            changed = conn.executemany(sql, rows).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return changed
+
+# Server-side holdings, so the session cookie only carries the user
+class HoldingsStore(SQLiteStore):
+    """Per-user holdings in SQLite, keyed by email.
+
+    Emails map to small integer ids in ``users``; each row of ``holdings`` is
+    one lot (a symbol added without quantity is a lot of zero, i.e. a
+    watchlist entry). Reads go through the (user_id, symbol) index, and adds
+    and removes take lists and run in one transaction.
+    """
+    durable = True
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.user_ids = {}
+        self.lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, email TEXT NOT NULL UNIQUE)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS holdings ("
+            "id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, symbol TEXT NOT NULL, "
+            "quantity REAL NOT NULL DEFAULT 0, buy_price REAL NOT NULL DEFAULT 0, "
+            "buy_date TEXT, family_member TEXT NOT NULL DEFAULT '')"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS holdings_user_symbol ON holdings (user_id, symbol)")
+
+    def _user_id(self, email, create=False):
+        user_id = self.user_ids.get(email)
+        if user_id is not None:
+            return user_id
+        conn = self._conn()
+        row = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            conn.execute("INSERT OR IGNORE INTO users (email) VALUES (?)", (email,))
+            row = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
+        with self.lock:
+            self.user_ids[email] = row[0]
+        return row[0]
+
+    def symbols(self, email):
+        """Distinct symbols held, in the order they were first added"""
+        user_id = self._user_id(email)
+        if user_id is None:
+            return []
+        return [row[0] for row in self._conn().execute(
+            "SELECT symbol FROM holdings WHERE user_id = ? GROUP BY symbol ORDER BY MIN(id)", (user_id,)
+        )]
+
+    def lots(self, email):
+        user_id = self._user_id(email)
+        if user_id is None:
+            return []
+        return [
+            {'id': row[0], 'symbol': row[1], 'quantity': row[2], 'buy_price': row[3],
+             'buy_date': row[4], 'family_member': row[5]}
+            for row in self._conn().execute(
+                "SELECT id, symbol, quantity, buy_price, buy_date, family_member "
+                "FROM holdings WHERE user_id = ? ORDER BY id", (user_id,)
+            )
+        ]
+
+    def add_symbols(self, email, symbols):
+        """Add watchlist entries for symbols not already held; returns how many were added"""
+        user_id = self._user_id(email, create=True)
+        return self._write(
+            "INSERT INTO holdings (user_id, symbol) SELECT ?, ? "
+            "WHERE NOT EXISTS (SELECT 1 FROM holdings WHERE user_id = ? AND symbol = ?)",
+            [(user_id, symbol, user_id, symbol) for symbol in dict.fromkeys(symbols)]
+        )
+
+    def add_lots(self, email, lots):
+        """Insert lots (dicts with symbol, quantity, buy_price, buy_date, family_member)"""
+        user_id = self._user_id(email, create=True)
+        return self._write(
+            "INSERT INTO holdings (user_id, symbol, quantity, buy_price, buy_date, family_member) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (user_id, lot['symbol'], lot.get('quantity') or 0, lot.get('buy_price') or 0,
+                 lot.get('buy_date'), lot.get('family_member') or '')
+                for lot in lots
+            ]
+        )
+
+    def emails(self):
+        """Every user with at least one holding"""
+        return [row[0] for row in self._conn().execute(
+            "SELECT email FROM users WHERE id IN (SELECT DISTINCT user_id FROM holdings) ORDER BY id"
+        )]
+
+    def remove_symbols(self, email, symbols):
+        """Drop every lot of the given symbols; returns how many rows were removed"""
+        user_id = self._user_id(email)
+        if user_id is None:
+            return 0
+        return self._write(
+            "DELETE FROM holdings WHERE user_id = ? AND symbol = ?",
+            [(user_id, symbol) for symbol in dict.fromkeys(symbols)]
+        )
+
+class SessionHoldingsStore:
+    """Holdings in the signed session cookie, for deployments without HOLDINGS_DB.
+
+    Serverless hosts only offer a per-instance, ephemeral temp dir, so
+    without a configured database the symbol list stays in the cookie as it
+    always did. Only symbols fit there: lots, imports, snapshots and alerts
+    need the SQLite store. ``email`` arguments mirror HoldingsStore; the
+    session always belongs to the logged-in user.
+    """
+    durable = False
+
+    def symbols(self, email):
+        return list(session.get('stocks', []))
+
+    def lots(self, email):
+        return []
+
+    def emails(self):
+        return []
+
+    def add_symbols(self, email, symbols):
+        held = session.get('stocks', [])
+        added = [symbol for symbol in dict.fromkeys(symbols) if symbol not in held]
+        session['stocks'] = held + added
+        return len(added)
+
+    def remove_symbols(self, email, symbols):
+        held = session.get('stocks', [])
+        drop = set(symbols)
+        session['stocks'] = [symbol for symbol in held if symbol not in drop]
+        return len(held) - len(session['stocks'])
+
+HOLDINGS_DB = os.getenv('HOLDINGS_DB')
+if not HOLDINGS_DB and not is_production:
+    # Local development keeps holdings in a scratch file
+    HOLDINGS_DB = os.path.join(tempfile.gettempdir(), 'fintrack-holdings.db')
+if HOLDINGS_DB:
+    holdings_store = HoldingsStore(HOLDINGS_DB)
+else:
+    logger.warning("HOLDINGS_DB is not set; holdings stay in the session cookie and imports, snapshots and alerts are disabled")
+    holdings_store = SessionHoldingsStore()
+
+# Upper bound on symbols accepted by one holdings add/remove request
+MAX_HOLDINGS_CHANGE = 500
+
+def _listing_symbol(symbol):
+    """Yahoo symbol for user input, resolved from the symbol master (NSE by default)"""
+    symbol = symbol.upper().strip()
+    if symbol.endswith(('.NS', '.BO')):
+        return symbol
+    return f"{symbol}.{symbol_master.resolve_exchange(symbol) or 'NS'}"
+
+def _session_holdings():
+    """Symbols held by the logged-in user, moving any legacy cookie list into a durable store"""
+    email = session['user']['email']
+    legacy = session.pop('stocks', None) if holdings_store.durable else None
+    if legacy:
+        holdings_store.add_symbols(email, legacy)
+    return holdings_store.symbols(email)
+
+# Daily portfolio value series, one point appended per trading day
+class PortfolioHistoryStore:
+    """Per-user daily portfolio value, stored column by column.
+
+    Each user's series is one small binary file: a header, then the date
+    ordinals, the market values and the invested amounts as contiguous
+    arrays. A snapshot appends (or replaces) a single day, so the work per
+    day is one valuation at that day's closes and earlier days are never
+    recomputed; reading a chart is one O(days) file read.
+    """
+    MAGIC = b'PVH1'
+    HEADER = struct.Struct('<4sI')
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, email):
+        # Hash the email so the file name is fixed-length and path safe
+        return os.path.join(self.directory, hashlib.sha1(email.lower().encode()).hexdigest()[:20] + '.pvh')
+
+    def load(self, email):
+        """Return (dates, values, invested) arrays, empty if there is no history yet"""
+        dates, values, invested = array('i'), array('d'), array('d')
+        try:
+            with open(self._path(email), 'rb') as f:
+                magic, count = self.HEADER.unpack(f.read(self.HEADER.size))
+                if magic != self.MAGIC:
+                    return array('i'), array('d'), array('d')
+                dates.fromfile(f, count)
+                values.fromfile(f, count)
+                invested.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return array('i'), array('d'), array('d')
+        if sys.byteorder != 'little':
+            for column in (dates, values, invested):
+                column.byteswap()
+        return dates, values, invested
+
+    def append(self, email, ordinal, value, invested_amount):
+        """Record one day's snapshot, replacing an existing point for the same day"""
+        with self.lock:
+            dates, values, invested = self.load(email)
+            if dates and dates[-1] >= ordinal:
+                if dates[-1] > ordinal:
+                    # Never rewrite older history out of order
+                    return False
+                dates.pop()
+                values.pop()
+                invested.pop()
+            dates.append(ordinal)
+            values.append(value)
+            invested.append(invested_amount)
+            self._save(email, dates, values, invested)
+            return True
+
+    def load_closes(self):
+        """The last live close used by a snapshot, as {symbol: [ordinal, price]}"""
+        try:
+            with open(os.path.join(self.directory, 'closes.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_closes(self, closes):
+        path = os.path.join(self.directory, 'closes.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(closes, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not persist snapshot closes: %s", e)
+
+    def _save(self, email, dates, values, invested):
+        columns = (dates, values, invested)
+        if sys.byteorder != 'little':
+            columns = tuple(array(column.typecode, column) for column in columns)
+            for column in columns:
+                column.byteswap()
+        path = self._path(email)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, len(dates)))
+                for column in columns:
+                    column.tofile(f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not persist portfolio history: %s", e)
+
+PORTFOLIO_HISTORY_DIR = os.getenv(
+    'PORTFOLIO_HISTORY_DIR', os.path.join(tempfile.gettempdir(), 'fintrack-portfolio-history'))
+portfolio_history = PortfolioHistoryStore(PORTFOLIO_HISTORY_DIR)
+
+# Snapshots are taken once the day's closes have settled
+SNAPSHOT_TIME = dt_time(16, 0)
+
+class PortfolioSnapshotter:
+    """End-of-day job appending every user's portfolio value to their history.
+
+    All users' symbols are priced together in batched live fetches that
+    bypass the cache tiers, so stale and static prices never enter the
+    series. A symbol Yahoo does not price today carries forward its close
+    from the previous snapshot; a user holding a symbol that has never had
+    a live close is skipped for the day rather than valued at cost. Runs on
+    weekdays after SNAPSHOT_TIME IST, either on a daemon thread or when
+    triggered through /api/portfolio/snapshot (e.g. by a scheduled job on
+    serverless hosts).
+    """
+    def __init__(self, holdings, history):
+        self.holdings = holdings
+        self.history = history
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.runs = 0
+        self.last_run = None
+        self.last_users = 0
+        self.last_carried = 0
+        self.last_skipped = 0
+
+    def snapshot_all(self, now=None):
+        """Snapshot every user for today's IST date; returns the number of users recorded"""
+        today = (now or datetime.now(IST)).astimezone(IST).date()
+        emails = self.holdings.emails()
+        lots_by_user = {email: [lot for lot in self.holdings.lots(email) if lot['quantity'] > 0] for email in emails}
+        symbols = sorted({lot['symbol'] for lots in lots_by_user.values() for lot in lots})
+
+        closes = self.history.load_closes()
+        priced = set()
+        for i in range(0, len(symbols), MAX_BATCH_SYMBOLS):
+            for symbol, quote in _fetch_stock_data_many(symbols[i:i + MAX_BATCH_SYMBOLS]).items():
+                if quote.get('success') and quote.get('source') == 'live':
+                    closes[symbol] = [today.toordinal(), quote['current_price']]
+                    priced.add(symbol)
+        if priced:
+            self.history.save_closes(closes)
+
+        recorded = skipped = 0
+        for email, lots in lots_by_user.items():
+            unpriced = sorted({lot['symbol'] for lot in lots if lot['symbol'] not in closes})
+            if unpriced:
+                logger.warning("Skipping portfolio snapshot for a user: no live close yet for %s", ', '.join(unpriced))
+                skipped += 1
+                continue
+            value = sum(lot['quantity'] * closes[lot['symbol']][1] for lot in lots)
+            invested = sum(lot['quantity'] * lot['buy_price'] for lot in lots)
+            if self.history.append(email, today.toordinal(), round(value, 2), round(invested, 2)):
+                recorded += 1
+
+        self.runs += 1
+        self.last_run = time.time()
+        self.last_users = recorded
+        self.last_carried = sum(1 for symbol in symbols if symbol in closes and symbol not in priced)
+        self.last_skipped = skipped
+        logger.info("Portfolio snapshot for %s recorded %s users (%s symbols, %s carried forward, %s users skipped)",
+                    today, recorded, len(symbols), self.last_carried, skipped)
+        return recorded
+
+    def seconds_until_due(self, now=None):
+        """Seconds until the next weekday SNAPSHOT_TIME in IST"""
+        now = (now or datetime.now(IST)).astimezone(IST)
+        candidate = datetime.combine(now.date(), SNAPSHOT_TIME, IST)
+        if candidate <= now:
+            candidate += timedelta(days=1)
+        while candidate.weekday() >= 5:
+            candidate += timedelta(days=1)
+        return (candidate - now).total_seconds()
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='portfolio-snapshots', daemon=True)
+        self.thread.start()
+        logger.info("Portfolio snapshots scheduled daily at %s IST", SNAPSHOT_TIME)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.seconds_until_due()):
+            try:
+                self.snapshot_all()
+            except Exception as e:
+                logger.warning("Portfolio snapshot failed: %s", e)
+
+    def stats(self):
+        return {
+            'running': self.thread is not None and self.thread.is_alive(),
+            'runs': self.runs,
+            'last_run': self.last_run,
+            'last_users': self.last_users,
+            'last_carried': self.last_carried,
+            'last_skipped': self.last_skipped
+        }
+
+portfolio_snapshotter = PortfolioSnapshotter(holdings_store, portfolio_history)
+if os.getenv('PORTFOLIO_SNAPSHOTS', 'false').lower() == 'true' and holdings_store.durable:
+    portfolio_snapshotter.start()
+
+# Price and percent-change alerts, checked as fresh quotes land in stock_cache
+ALERT_KINDS = ('price_above', 'price_below', 'change_above', 'change_below')
+MAX_ALERTS_PER_USER = 200
+
+class AlertStore(SQLiteStore):
+    """Alert rules in SQLite, in the same database as the holdings.
+
+    A rule is active until it fires. Firing stamps the row with the time,
+    price and percent change that triggered it, so the same table is the
+    user's feed of fired alerts. Triggers log the id of every rule that is
+    added, deleted or fired, so each process can sync just those rules.
+    """
+    # Change log entries kept; a reader further behind reloads every rule
+    CHANGE_RETENTION = 10000
+
+    def __init__(self, path):
+        super().__init__(path)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS alert_rules ("
+            "id INTEGER PRIMARY KEY, email TEXT NOT NULL, symbol TEXT NOT NULL, kind TEXT NOT NULL, "
+            "threshold REAL NOT NULL, created_at REAL NOT NULL, "
+            "fired_at REAL, fired_price REAL, fired_change REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS alert_rules_email ON alert_rules (email, fired_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS alert_rule_changes ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, rule_id INTEGER NOT NULL)"
+        )
+        for name, event, row in (('add', 'INSERT', 'NEW'), ('remove', 'DELETE', 'OLD'), ('fire', 'UPDATE OF fired_at', 'NEW')):
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS alert_rules_log_{name} AFTER {event} ON alert_rules "
+                f"BEGIN INSERT INTO alert_rule_changes (rule_id) VALUES ({row}.id); END"
+            )
+
+    def last_change(self):
+        return self._conn().execute("SELECT COALESCE(MAX(seq), 0) FROM alert_rule_changes").fetchone()[0]
+
+    def changes_since(self, seq):
+        """Rules changed after change ``seq``, as (latest seq, {id: (symbol, kind, threshold) or None}).
+
+        None marks a rule that is no longer active. Returns None when the
+        log has been pruned past ``seq`` or holds more changes than it keeps,
+        so reloading every rule is the cheaper way to catch up.
+        """
+        conn = self._conn()
+        rows = conn.execute("SELECT seq, rule_id FROM alert_rule_changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        if not rows:
+            return seq, {}
+        if len(rows) > self.CHANGE_RETENTION or (
+            rows[0][0] > seq + 1 and conn.execute("SELECT MIN(seq) FROM alert_rule_changes").fetchone()[0] > seq + 1
+        ):
+            return None
+        ids = list({rule_id for _, rule_id in rows})
+        current = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            current.update(
+                (rule_id, (symbol, kind, threshold))
+                for rule_id, symbol, kind, threshold in conn.execute(
+                    "SELECT id, symbol, kind, threshold FROM alert_rules "
+                    f"WHERE fired_at IS NULL AND id IN ({','.join('?' * len(chunk))})", chunk
+                )
+            )
+        return rows[-1][0], {rule_id: current.get(rule_id) for rule_id in ids}
+
+    def _prune_changes(self):
+        self._conn().execute(
+            "DELETE FROM alert_rule_changes WHERE seq <= (SELECT MAX(seq) FROM alert_rule_changes) - ?",
+            (self.CHANGE_RETENTION,)
+        )
+
+    def active(self):
+        """(id, symbol, kind, threshold) of every rule that has not fired"""
+        return self._conn().execute(
+            "SELECT id, symbol, kind, threshold FROM alert_rules WHERE fired_at IS NULL"
+        ).fetchall()
+
+    def add(self, email, symbol, kind, threshold, limit):
+        """Insert a rule unless the user already has ``limit`` active ones; returns its id or None.
+
+        The count and the insert are one statement, so concurrent requests
+        (from any worker) cannot take a user past the limit.
+        """
+        cursor = self._conn().execute(
+            "INSERT INTO alert_rules (email, symbol, kind, threshold, created_at) "
+            "SELECT ?, ?, ?, ?, ? WHERE (SELECT COUNT(*) FROM alert_rules WHERE email = ? AND fired_at IS NULL) < ?",
+            (email, symbol, kind, threshold, time.time(), email, limit)
+        )
+        if cursor.rowcount != 1:
+            return None
+        self._prune_changes()
+        return cursor.lastrowid
+
+    def remove(self, email, rule_id):
+        """Delete one of the user's rules; returns its (symbol, kind, threshold, fired_at) or None"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT symbol, kind, threshold, fired_at FROM alert_rules WHERE id = ? AND email = ?", (rule_id, email)
+        ).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,))
+        return row
+
+    def rules(self, email, fired=False, since=0, limit=100):
+        """The user's active rules, or with ``fired`` those fired after ``since``, newest first"""
+        if fired:
+            where, params = "fired_at > ?", (email, since, limit)
+        else:
+            where, params = "fired_at IS NULL", (email, limit)
+        rows = self._conn().execute(
+            "SELECT id, symbol, kind, threshold, created_at, fired_at, fired_price, fired_change "
+            f"FROM alert_rules WHERE email = ? AND {where} ORDER BY {'fired_at' if fired else 'id'} DESC LIMIT ?",
+            params
+        ).fetchall()
+        return [
+            {
+                'id': rule_id, 'symbol': symbol, 'kind': kind, 'threshold': threshold, 'created_at': created_at,
+                **({'fired_at': fired_at, 'price': price, 'change': change} if fired else {})
+            }
+            for rule_id, symbol, kind, threshold, created_at, fired_at, price, change in rows
+        ]
+
+    def record_fired(self, firings):
+        """Mark rules fired from (fired_at, price, change, rule_id) rows in one transaction.
+
+        Returns how many rules this call fired; rules another process fired
+        first are left alone and not counted.
+        """
+        fired = self._write(
+            "UPDATE alert_rules SET fired_at = ?, fired_price = ?, fired_change = ? WHERE id = ? AND fired_at IS NULL",
+            firings
+        )
+        self._prune_changes()
+        return fired
+
+class AlertEngine:
+    """Match fresh quotes against every active alert rule without scanning them.
+
+    Rules are held in memory per (symbol, kind) as lists of (threshold, id)
+    sorted by threshold, so a quote finds all the rules it crosses with one
+    bisect and removes them as a slice; rules are one-shot. The stock_cache
+    listener only records the latest quote per symbol and wakes the
+    evaluator thread, which drains everything pending as one batch and
+    writes the firings in one transaction. The index is built from the store
+    on first use rather than at import; after that, rules added, deleted or
+    fired elsewhere (e.g. by another gunicorn worker) are synced one by one
+    from the store's change log.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.index = None
+        # (symbol, kind, threshold) of every indexed rule, by id
+        self.rules = {}
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.counters = {'quotes': 0, 'batches': 0, 'fired': 0}
+
+    def _load(self):
+        # Caller holds self.lock
+        if self.index is not None:
+            changes = self.store.changes_since(self.seq)
+            if changes is not None:
+                self.seq, changed = changes
+                for rule_id, rule in changed.items():
+                    self._unindex(rule_id)
+                    if rule is not None:
+                        self._index(rule_id, *rule)
+                return self.index
+
+        # Read the log position first: changes made during the load are
+        # replayed by the next sync, which is harmless
+        seq = self.store.last_change()
+        self.index, self.rules = {}, {}
+        for rule_id, symbol, kind, threshold in self.store.active():
+            self.index.setdefault((symbol, kind), []).append((threshold, rule_id))
+            self.rules[rule_id] = (symbol, kind, threshold)
+        for rules in self.index.values():
+            rules.sort()
+        self.seq = seq
+        logger.info("Loaded %s price alert rules", len(self.rules))
+        return self.index
+
+    def _index(self, rule_id, symbol, kind, threshold):
+        bisect.insort(self.index.setdefault((symbol, kind), []), (threshold, rule_id))
+        self.rules[rule_id] = (symbol, kind, threshold)
+
+    def _unindex(self, rule_id):
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return
+        symbol, kind, threshold = rule
+        rules = self.index.get((symbol, kind))
+        if rules:
+            i = bisect.bisect_left(rules, (threshold, rule_id))
+            if i < len(rules) and rules[i] == (threshold, rule_id):
+                del rules[i]
+
+    def add_rule(self, email, symbol, kind, threshold, limit=None):
+        """Add a rule; returns its id, or None if the user already has ``limit`` active rules"""
+        with self.lock:
+            self._load()
+            rule_id = self.store.add(email, symbol, kind, threshold, MAX_ALERTS_PER_USER if limit is None else limit)
+            if rule_id is not None:
+                self._index(rule_id, symbol, kind, threshold)
+        return rule_id
+
+    def remove_rule(self, email, rule_id):
+        """Delete a rule, active or fired; returns False if the user has no such rule"""
+        with self.lock:
+            self._load()
+            if self.store.remove(email, rule_id) is None:
+                return False
+            self._unindex(rule_id)
+        return True
+
+    def quote_updated(self, key, quote):
+        """stock_cache listener: note the quote and wake the evaluator without waiting on it"""
+        if not quote.get('success'):
+            return
+        with self.pending_lock:
+            self.pending[quote['symbol']] = (quote['current_price'], quote['change'])
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='price-alerts', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.pending_lock:
+                quotes, self.pending = self.pending, {}
+            if not quotes:
+                continue
+            try:
+                self.evaluate(quotes)
+            except Exception as e:
+                logger.warning("Price alert evaluation failed: %s", e)
+
+    def evaluate(self, quotes):
+        """Fire the rules crossed by ``quotes`` ({symbol: (price, change)}); returns how many fired"""
+        now = time.time()
+        firings = []
+        with self.lock:
+            index = self._load()
+            for symbol, (price, change) in quotes.items():
+                for measure, value in (('price', price), ('change', change)):
+                    above = index.get((symbol, measure + '_above'))
+                    if above:
+                        # Every threshold at or below the value has been crossed
+                        end = bisect.bisect_right(above, (value, math.inf))
+                        firings.extend((now, price, change, rule_id) for _, rule_id in above[:end])
+                        del above[:end]
+                    below = index.get((symbol, measure + '_below'))
+                    if below:
+                        start = bisect.bisect_left(below, (value,))
+                        firings.extend((now, price, change, rule_id) for _, rule_id in below[start:])
+                        del below[start:]
+            for firing in firings:
+                self.rules.pop(firing[3], None)
+        self.counters['quotes'] += len(quotes)
+        self.counters['batches'] += 1
+        fired = 0
+        if firings:
+            # Rules another worker fired first do not count again
+            fired = self.store.record_fired(firings)
+            self.counters['fired'] += fired
+            if fired:
+                logger.info("Fired %s price alerts across %s symbols", fired, len(quotes))
+        return fired
+
+    def stats(self):
+        with self.lock:
+            rules = len(self.rules) if self.index is not None else None
+        return {'rules': rules, 'pending': len(self.pending), **self.counters}
+
+# Rules live next to the holdings, so alerts are off without HOLDINGS_DB
+alert_engine = AlertEngine(AlertStore(HOLDINGS_DB)) if holdings_store.durable else None
+if alert_engine is not None:
+    stock_cache.listeners.append(alert_engine.quote_updated)
+
+def _sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+# Browsers may keep the Firebase config for an hour; it only changes on redeploy
+FIREBASE_CONFIG_MAX_AGE = 3600
+
+def cached_json_response(encoded, max_age, private=True):
+    """Serve pre-encoded JSON with an ETag and Cache-Control, answering 304 on a matching If-None-Match"""
+    gzipped = encoded.gzipped is not None and 'gzip' in request.accept_encodings
+    response = Response(encoded.gzipped if gzipped else encoded.body, mimetype='application/json')
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    if encoded.gzipped is not None:
+        response.vary.add('Accept-Encoding')
+    # Weak, so the gzipped and identity bodies share one validator
+    response.set_etag(encoded.etag, weak=True)
+    response.cache_control.private = private or None
+    response.cache_control.public = not private or None
+    response.cache_control.max_age = max(0, int(max_age))
+    return response.make_conditional(request)
+
+def cached_entry_response(cache, key, value):
+    """Serve a value returned from cache, reusing its stored encoding and remaining freshness"""
+    entry = cache.get_encoded(key, value)
+    if entry is None:
+        # Not (or no longer) the cached value: encode it once and let clients revalidate
+        return cached_json_response(EncodedPayload(value), 0)
+    encoded, expires = entry
+    return cached_json_response(encoded, expires - time.time())
+
+@lru_cache(maxsize=1)
+def _firebase_config_payload():
+    return EncodedPayload({
         "apiKey": os.getenv('FIREBASE_API_KEY'),
         "authDomain": os.getenv('FIREBASE_AUTH_DOMAIN'),
         "databaseURL": os.getenv('FIREBASE_DATABASE_URL'),
@@ -368,10 +2981,14 @@ def firebase_config():
         "storageBucket": os.getenv('FIREBASE_STORAGE_BUCKET'),
         "messagingSenderId": os.getenv('FIREBASE_MESSAGING_SENDER_ID'),
         "appId": os.getenv('FIREBASE_APP_ID')
-    }
-    return jsonify(config)
+    })
+
+@views.route('/firebase-config')
+def firebase_config():
+    """Return Firebase configuration as JSON for client-side initialization"""
+    return cached_json_response(_firebase_config_payload(), FIREBASE_CONFIG_MAX_AGE, private=False)
 
-@app.route('/api/stock-data')
+@views.route('/api/stock-data')
 @login_required
 def get_stock_data_api():
     """API endpoint to get stock data"""
@@ -386,19 +3003,322 @@ def get_stock_data_api():
     
     # If static_only flag is set, only return from the fallback data
     if static_only:
-        if base_symbol in FALLBACK_STOCKS:
-            print(f"Providing static data for {base_symbol} (client-side request)")
-            result = FALLBACK_STOCKS[base_symbol].copy()
-            result['success'] = True
-            return jsonify(result)
+        result = static_quotes.quote(base_symbol)
+        if result:
+            logger.debug("Providing static data for %s (client-side request)", base_symbol)
+            quote_chain.record(static_quotes)
+            return cached_json_response(EncodedPayload(result), quote_ttl())
         else:
             return jsonify({"success": False, "error": "No static data available"})
     
     # Use the enhanced stock data fetching function
+    quote_prefetcher.track([symbol])
     result = get_stock_data(symbol)
-    return jsonify(result)
+    # Fallback answers carry the fallback cache's shorter freshness
+    cache = stock_cache if result.get('source') == 'live' else quote_chain.fallbacks
+    return cached_entry_response(cache, symbol, result)
+
+@views.route('/api/stock-data/intraday')
+@login_required
+def intraday_bars_api():
+    """OHLC bars for today's quotes of one symbol, built from the recorded ticks.
+
+    ``interval`` is one of INTRADAY_INTERVALS. Ticks accumulate as quotes are
+    refreshed, so bars are as fine as the quote refresh rate allows.
+    """
+    symbol = request.args.get('symbol', '').upper().strip()
+    interval = request.args.get('interval', '5m')
+    if not symbol:
+        return jsonify({"success": False, "error": "Symbol is required"})
+    if interval not in INTRADAY_INTERVALS:
+        return jsonify({"success": False, "error": f"interval must be one of {', '.join(INTRADAY_INTERVALS)}"})
+
+    # Keep the symbol refreshing in the background so bars keep filling in
+    quote_prefetcher.track([symbol])
+    base_symbol = symbol.split('.')[0]
+    bars = intraday_ticks.bars(base_symbol, INTRADAY_INTERVALS[interval])
+    if bars is None:
+        # Never quoted in this process; a fetch records the first tick
+        get_stock_data(symbol)
+        bars = intraday_ticks.bars(base_symbol, INTRADAY_INTERVALS[interval]) or ([], [], [], [], [])
+    starts, opens, highs, lows, closes = bars
+    return jsonify({
+        "success": True,
+        "symbol": base_symbol,
+        "interval": interval,
+        "time": starts,
+        "open": opens,
+        "high": highs,
+        "low": lows,
+        "close": closes
+    })
+
+@views.route('/api/stock-data/batch')
+@login_required
+def get_stock_data_batch_api():
+    """API endpoint to get stock data for many symbols in one request"""
+    symbols = []
+    for symbol in request.args.get('symbols', '').split(','):
+        symbol = symbol.upper().strip()
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+
+    if not symbols:
+        return jsonify({"success": False, "error": "Symbols are required"})
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"success": False, "error": f"At most {MAX_BATCH_SYMBOLS} symbols per request"})
 
-@app.route('/get_stock_info')
+    quote_prefetcher.track(symbols)
+    return jsonify({"success": True, "data": get_stock_data_many(symbols)})
+
+@views.route('/api/stream/prices')
+@login_required
+def stream_prices_api():
+    """Server-Sent Events stream of price deltas for the requested symbols.
+
+    Sends a ``snapshot`` event with every symbol's current quote, then a
+    ``prices`` event whenever any of them changes. Each event maps a symbol
+    to ``[current_price, change]``.
+    """
+    symbols = []
+    for symbol in request.args.get('symbols', '').split(','):
+        symbol = symbol.upper().strip()
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+
+    if not symbols:
+        return jsonify({"success": False, "error": "Symbols are required"})
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"success": False, "error": f"At most {MAX_BATCH_SYMBOLS} symbols per request"})
+
+    quote_prefetcher.track(symbols)
+
+    def generate():
+        snapshot = {
+            symbol: [quote['current_price'], quote['change']]
+            for symbol, quote in get_stock_data_many(symbols).items()
+            if quote.get('success')
+        }
+        yield f"retry: {int(price_hub.interval * 1000)}\n"
+        yield _sse_event('snapshot', snapshot)
+
+        subscriber = price_hub.subscribe(symbols, snapshot)
+        try:
+            while True:
+                try:
+                    delta = subscriber.get(timeout=25)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse_event('prices', delta)
+        finally:
+            price_hub.unsubscribe(subscriber)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Upper bound on lots accepted by one portfolio summary request
+MAX_PORTFOLIO_LOTS = 10000
+
+def _holding_field(holding, *names):
+    """Read the first present field, accepting snake_case and Firestore camelCase names"""
+    for name in names:
+        if holding.get(name) not in (None, ''):
+            return holding[name]
+    return None
+
+def _summary_dict(totals, index, xirr_rate):
+    invested = float(totals['invested'][index])
+    pnl = float(totals['pnl'][index])
+    return {
+        "invested": round(invested, 2),
+        "current_value": round(float(totals['current_value'][index]), 2),
+        "pnl": round(pnl, 2),
+        "pnl_pct": round(pnl / invested * 100, 2) if invested > 0 else 0,
+        "day_change": round(float(totals['day_change'][index]), 2),
+        "xirr": None if math.isnan(xirr_rate) else round(float(xirr_rate) * 100, 2)
+    }
+
+@views.route('/api/portfolio/summary', methods=['POST'])
+@login_required
+def portfolio_summary_api():
+    """API endpoint valuing a list of lots against cached quotes.
+
+    Expects ``{"holdings": [{"symbol", "quantity", "buy_price", "buy_date",
+    "family_member", "current_price"}, ...]}`` where buy_date (YYYY-MM-DD),
+    family_member and current_price (used if the symbol cannot be priced)
+    are optional. Lots without a buy date are left out of XIRR.
+    """
+    # numpy is only needed here, so keep it out of the cold-start path
+    import numpy as np
+    import valuation
+
+    payload = request.get_json(silent=True) or {}
+    holdings = payload.get('holdings')
+    if not isinstance(holdings, list) or not holdings:
+        return jsonify({"success": False, "error": "Holdings are required"})
+    if len(holdings) > MAX_PORTFOLIO_LOTS:
+        return jsonify({"success": False, "error": f"At most {MAX_PORTFOLIO_LOTS} lots per request"})
+
+    symbols, quantities, buy_prices, buy_dates, members, known_prices = [], [], [], [], [], []
+    try:
+        for holding in holdings:
+            symbols.append(str(_holding_field(holding, 'symbol')).upper().strip())
+            quantities.append(float(_holding_field(holding, 'quantity')))
+            buy_prices.append(float(_holding_field(holding, 'buy_price', 'buyPrice')))
+            buy_date = _holding_field(holding, 'buy_date', 'buyDate')
+            buy_dates.append(date.fromisoformat(buy_date[:10]).toordinal() if buy_date else 0)
+            members.append(str(_holding_field(holding, 'family_member', 'familyMember') or ''))
+            known_price = _holding_field(holding, 'current_price', 'currentPrice')
+            known_prices.append(float(known_price) if known_price is not None else np.nan)
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({"success": False, "error": f"Invalid holding: {str(e)}"})
+
+    # Join lots against quotes: price each distinct symbol once
+    unique_symbols, symbol_index = np.unique(np.array(symbols), return_inverse=True)
+    quotes = {}
+    for i in range(0, len(unique_symbols), MAX_BATCH_SYMBOLS):
+        quotes.update(get_stock_data_many(list(unique_symbols[i:i + MAX_BATCH_SYMBOLS])))
+    quote_prices = np.array([
+        quotes[symbol]['current_price'] if quotes.get(symbol, {}).get('success') else np.nan
+        for symbol in unique_symbols
+    ])
+    quote_changes = np.array([
+        quotes[symbol].get('change', 0) if quotes.get(symbol, {}).get('success') else 0
+        for symbol in unique_symbols
+    ], dtype=np.float64)
+
+    buy_prices = np.array(buy_prices)
+    prices = quote_prices[symbol_index]
+    prices = np.where(np.isnan(prices), np.array(known_prices), prices)
+    unpriced = np.isnan(prices)
+    # Unpriced lots are carried at cost so they do not distort P&L
+    prices = np.where(unpriced, buy_prices, prices)
+    changes = np.where(unpriced, 0.0, quote_changes[symbol_index])
+
+    lots = valuation.value_lots(quantities, buy_prices, prices, changes)
+
+    # Group 0 is the whole portfolio, groups 1..n are family members
+    member_names, member_index = np.unique(np.array(members), return_inverse=True)
+    n_groups = len(member_names) + 1
+    lot_groups = member_index + 1
+    totals = valuation.group_totals(lots, lot_groups, n_groups)
+    for name in totals:
+        totals[name][0] = totals[name][1:].sum()
+
+    # Cash flows: each dated lot's purchase plus one terminal value per group
+    as_of = date.today().toordinal()
+    buy_dates = np.array(buy_dates)
+    dated = buy_dates > 0
+    years = (buy_dates[dated] - as_of) / valuation.DAYS_PER_YEAR
+    outflows = -lots['invested'][dated]
+    terminal = np.bincount(lot_groups[dated], weights=lots['current_value'][dated], minlength=n_groups)
+    terminal[0] = terminal[1:].sum()
+    rates = valuation.xirr(
+        np.concatenate([outflows, outflows, terminal]),
+        np.concatenate([years, years, np.zeros(n_groups)]),
+        np.concatenate([np.zeros(len(outflows), dtype=np.intp), lot_groups[dated], np.arange(n_groups)]),
+        n_groups
+    )
+
+    return jsonify({
+        "success": True,
+        "as_of": date.fromordinal(as_of).isoformat(),
+        "lots": len(holdings),
+        "total": _summary_dict(totals, 0, rates[0]),
+        "members": {
+            name: _summary_dict(totals, i + 1, rates[i + 1])
+            for i, name in enumerate(member_names.tolist())
+        },
+        "unpriced": sorted(set(np.array(symbols)[unpriced].tolist()))
+    })
+
+@views.route('/api/symbols/search')
+@login_required
+def symbol_search_api():
+    """API endpoint for symbol and company-name autocomplete from the local symbol master"""
+    query = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    if not query.strip():
+        return jsonify({"success": False, "error": "Query is required"})
+    return jsonify({"success": True, "results": symbol_master.search(query, limit)})
+
+def _cache_events():
+    events = {}
+    for name, cache in (('stock', stock_cache), ('mutual_fund', mf_cache)):
+        stats = cache.stats()
+        for event in ('hits', 'disk_hits', 'misses', 'stale_serves', 'evictions', 'refreshes'):
+            events[(name, event)] = stats[event]
+    return events
+
+metrics.registry.callback(
+    'fintrack_cache_events_total', 'Cache lookups and maintenance events', _cache_events,
+    ('cache', 'event'), kind='counter')
+metrics.registry.callback(
+    'fintrack_cache_entries', 'Entries currently held in memory',
+    lambda: {('stock',): len(stock_cache), ('mutual_fund',): len(mf_cache)}, ('cache',))
+metrics.registry.callback(
+    'fintrack_single_flight_coalesced_total', 'Callers that shared an in-flight upstream fetch',
+    lambda: stock_fetches.stats()['coalesced'], kind='counter')
+metrics.registry.callback(
+    'fintrack_quote_tier_answers_total', 'Quotes answered by each provider tier',
+    lambda: {(tier,): count for tier, count in quote_chain.answers.items()}, ('tier',), kind='counter')
+metrics.registry.callback(
+    'fintrack_hedged_requests_total', 'Duplicate live quote calls started after the p95 latency',
+    lambda: live_quotes.counters['hedges'], kind='counter')
+metrics.registry.callback(
+    'fintrack_price_alerts_fired_total', 'Price alert rules fired by fresh quotes',
+    lambda: alert_engine.counters['fired'] if alert_engine else 0, kind='counter')
+metrics.registry.callback(
+    'fintrack_yahoo_circuit_open', '1 while the Yahoo Finance circuit breaker is open',
+    lambda: 1 if yahoo_breaker.stats()['state'] == 'open' else 0)
+
+@views.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of request, upstream, cache and fallback metrics.
+
+    Scrapers authenticate with 'Bearer $METRICS_TOKEN'; a logged-in session
+    also works. METRICS_PUBLIC=true opens the endpoint to anyone.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    authorized = (
+        os.getenv('METRICS_PUBLIC') == 'true'
+        or (token and request.headers.get('Authorization') == f'Bearer {token}')
+        or 'user' in session
+    )
+    if not authorized:
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@views.route('/api/cache-stats')
+@login_required
+def cache_stats_api():
+    """API endpoint exposing quote cache and request coalescing counters"""
+    return jsonify({
+        "success": True,
+        "stock_cache": stock_cache.stats(),
+        "mf_cache": mf_cache.stats(),
+        "single_flight": stock_fetches.stats(),
+        "yahoo_circuit": yahoo_breaker.stats(),
+        "yahoo_throttled": yahoo_limiter.throttled,
+        "prefetcher": quote_prefetcher.stats(),
+        "price_stream": price_hub.stats(),
+        "quote_tiers": quote_chain.stats(),
+        "portfolio_snapshots": portfolio_snapshotter.stats(),
+        "alerts": alert_engine.stats() if alert_engine else None,
+        "intraday": intraday_ticks.stats(),
+        "scheme_index": scheme_index.stats(),
+        "startup": startup_timings
+    })
+
+@views.route('/get_stock_info')
 @login_required
 def get_stock_details():
     """Additional endpoint for detailed stock info"""
@@ -408,8 +3328,7 @@ def get_stock_details():
         if not symbol.endswith('.NS'):
             symbol = f"{symbol}.NS"
         
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        info = call_yahoo('yfinance_info', market_data().quote_info, symbol)
         
         if 'regularMarketPrice' not in info:
             return jsonify({
@@ -424,17 +3343,21 @@ def get_stock_details():
             'dayLow': info.get('dayLow', 0),
             'previousClose': info.get('previousClose', 0)
         })
+    except UpstreamUnavailable as e:
+        return jsonify({
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'error': str(e)
         }), 500
 
-@app.route('/')
+@views.route('/')
 @login_required
 def index():
     return render_template('dashboard.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -442,148 +3365,616 @@ def login():
         
         if email in users and users[email]['password'] == password:
             session['user'] = {'email': email, 'name': users[email]['name']}
-            return redirect(url_for('index'))
+            return redirect(url_for('fintrack.index'))
         else:
             flash('Invalid email or password', 'error')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@views.route('/logout')
 def logout():
     session.pop('user', None)
-    return redirect(url_for('login'))
+    return redirect(url_for('fintrack.login'))
 
-@app.route('/dashboard')
+@views.route('/dashboard')
 @login_required
 def dashboard():
     return render_template('dashboard.html')
 
-@app.route('/stocks', methods=['GET', 'POST'])
+@views.route('/stocks', methods=['GET', 'POST'])
 @login_required
 def stocks():
     user_email = session['user']['email']
     
-    # Only handle session-based storage for SSR mode,
+    # Only handle server-side holdings for SSR mode,
     # client-side will use Firebase directly
     if request.method == 'POST' and not (request.is_json or request.content_type == 'application/json'):
-        symbol = request.form.get('symbol', '').upper().strip()
-        if symbol:
-            # Check if it's one of our fallback stocks
-            base_symbol = symbol.split('.')[0]
-            if base_symbol in FALLBACK_STOCKS:
-                session.setdefault('stocks', []).append(f"{base_symbol}.NS")
-                flash(f'Added {base_symbol} to your portfolio', 'success')
-                return redirect(url_for('stocks'))
-                
-            # Try both NSE and BSE
-            try_symbols = [f"{symbol}.NS", f"{symbol}.BO"]
-            added = False
-            for try_symbol in try_symbols:
-                stock_info = get_stock_info(try_symbol)
-                if stock_info['success']:
-                    # For form submissions, use session and redirect
-                    session.setdefault('stocks', []).append(try_symbol)
-                    flash(f'Added {symbol} to your portfolio', 'success')
-                    added = True
-                    break
-            
-            if not added:
-                # Just add to NSE as fallback
-                session.setdefault('stocks', []).append(f"{symbol}.NS")
-                flash(f'Added {symbol} to your portfolio', 'success')
+        # Several symbols may be added at once, separated by commas or spaces
+        entered = [symbol for symbol in re.split(r'[\s,]+', request.form.get('symbol', '').upper()) if symbol]
+        entered = entered[:MAX_HOLDINGS_CHANGE]
+
+        # Known symbols resolve locally without any upstream validation; the
+        # rest race NSE and BSE together under one deadline, else default to NSE
+        unknown = [
+            symbol for symbol in entered
+            if not (symbol_master.resolve_exchange(symbol.split('.')[0]) or symbol.endswith(('.NS', '.BO')))
+        ]
+        resolved = resolve_listings(unknown) if unknown else {}
+        to_add = []
+        for symbol in entered:
+            if symbol in resolved:
+                to_add.append(resolved[symbol][0])
+            elif symbol in unknown:
+                to_add.append(f"{symbol}.NS")
+            else:
+                to_add.append(_listing_symbol(symbol))
+
+        if to_add:
+            holdings_store.add_symbols(user_email, to_add)
+            flash(f"Added {', '.join(symbol.split('.')[0] for symbol in to_add)} to your portfolio", 'success')
         
-        return redirect(url_for('stocks'))
+        return redirect(url_for('fintrack.stocks'))
 
-    # Get stocks from session for SSR
+    # Get holdings from the server-side store for SSR
+    held_symbols = _session_holdings()
+    quote_prefetcher.track(held_symbols)
     stocks_data = []
-    for symbol in session.get('stocks', []):
-        # Check if we have fallback data
-        base_symbol = symbol.split('.')[0]
-        if base_symbol in FALLBACK_STOCKS:
-            stock_data = FALLBACK_STOCKS[base_symbol].copy()
-            stocks_data.append(stock_data)
-            continue
-        
-        # Otherwise try to fetch live data
-        stock_info = get_stock_info(symbol)
-        if stock_info['success']:
-            stocks_data.append({
-                'symbol': stock_info['symbol'],
-                'company_name': stock_info['company_name'],
-                'current_price': stock_info['current_price'],
-                'change': stock_info['change']
-            })
-        else:
-            # Add placeholder data if API fails
-            stocks_data.append({
-                'symbol': base_symbol,
-                'company_name': f"{base_symbol} Stock",
-                'current_price': round(random.uniform(500, 3000), 2),
-                'change': round(random.uniform(-2, 2), 2)
-            })
+
+    # Price every cache miss with batched downloads under one page deadline
+    deadline = time.monotonic() + PAGE_FETCH_DEADLINE
+    live_data = {}
+    for i in range(0, len(held_symbols), MAX_BATCH_SYMBOLS):
+        chunk = held_symbols[i:i + MAX_BATCH_SYMBOLS]
+        live_data.update(get_stock_data_many(chunk, max(0, deadline - time.monotonic())))
+
+    for symbol in held_symbols:
+        stock_info = live_data.get(symbol) or quote_chain.fallback(symbol)
+        stocks_data.append({
+            'symbol': stock_info['symbol'],
+            'company_name': stock_info.get('company_name', f"{stock_info['symbol']} Stock"),
+            'current_price': stock_info.get('current_price'),
+            'change': stock_info.get('change'),
+            'source': stock_info['source']
+        })
 
     return render_template('stocks.html', stocks=stocks_data)
 
-@app.route('/mutual-funds')
+@views.route('/api/portfolio/holdings', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def portfolio_holdings_api():
+    """List, add or remove server-side holdings.
+
+    POST and DELETE take ``{"symbols": [...]}`` and apply the whole list in
+    one transaction. Symbols missing an exchange suffix resolve through the
+    symbol master, defaulting to NSE.
+    """
+    email = session['user']['email']
+    try:
+        if request.method == 'GET':
+            return jsonify({"success": True, "symbols": _session_holdings(), "lots": holdings_store.lots(email)})
+
+        payload = request.get_json(silent=True) or {}
+        symbols = payload.get('symbols')
+        if not isinstance(symbols, list) or not symbols or not all(isinstance(symbol, str) for symbol in symbols):
+            return jsonify({"success": False, "error": "A list of symbols is required"})
+        if len(symbols) > MAX_HOLDINGS_CHANGE:
+            return jsonify({"success": False, "error": f"At most {MAX_HOLDINGS_CHANGE} symbols per request"})
+
+        symbols = [_listing_symbol(symbol) for symbol in symbols if symbol.strip()]
+        if request.method == 'POST':
+            changed = holdings_store.add_symbols(email, symbols)
+        else:
+            changed = holdings_store.remove_symbols(email, symbols)
+        return jsonify({"success": True, "changed": changed, "symbols": holdings_store.symbols(email)})
+    except sqlite3.Error as e:
+        logger.warning("Holdings store error for %s: %s", email, e)
+        return jsonify({"success": False, "error": "Holdings are temporarily unavailable"}), 503
+
+# Bulk holdings import from broker CSV exports
+IMPORT_BATCH_ROWS = 500
+MAX_IMPORT_ROWS = 100000
+
+# Normalized header -> holding field, covering common broker export layouts
+IMPORT_COLUMNS = {
+    'symbol': 'symbol', 'instrument': 'symbol', 'tradingsymbol': 'symbol', 'trading_symbol': 'symbol',
+    'scrip': 'symbol', 'stock': 'symbol', 'ticker': 'symbol',
+    'quantity': 'quantity', 'qty': 'quantity', 'shares': 'quantity', 'quantity_available': 'quantity',
+    'buy_price': 'buy_price', 'avg_cost': 'buy_price', 'avg_price': 'buy_price', 'average_price': 'buy_price',
+    'buy_average': 'buy_price', 'purchase_price': 'buy_price', 'price': 'buy_price',
+    'buy_date': 'buy_date', 'date': 'buy_date', 'trade_date': 'buy_date', 'purchase_date': 'buy_date',
+    'family_member': 'family_member', 'member': 'family_member', 'owner': 'family_member'
+}
+IMPORT_DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d-%b-%Y', '%d %b %Y')
+
+def _import_columns(fieldnames):
+    """Map CSV headers to holding fields, ignoring case, dots and spacing"""
+    columns = {}
+    for name in fieldnames or []:
+        key = re.sub(r'[^a-z0-9]+', '_', (name or '').lower()).strip('_')
+        field = IMPORT_COLUMNS.get(key)
+        if field and field not in columns.values():
+            columns[name] = field
+    return columns
+
+def _import_number(value):
+    return float(value.replace(',', '').replace('₹', '').strip())
+
+def _parse_import_row(row, columns):
+    """Return (lot, None) for a valid row or (None, error)"""
+    fields = {field: (row.get(name) or '').strip() for name, field in columns.items()}
+    symbol = fields.get('symbol', '').upper()
+    if not symbol:
+        return None, 'Missing symbol'
+    try:
+        quantity = _import_number(fields.get('quantity', ''))
+        buy_price = _import_number(fields.get('buy_price') or '0')
+    except ValueError:
+        return None, 'Quantity and buy price must be numbers'
+    if quantity <= 0 or buy_price < 0:
+        return None, 'Quantity must be positive and buy price not negative'
+
+    buy_date = None
+    if fields.get('buy_date'):
+        for date_format in IMPORT_DATE_FORMATS:
+            try:
+                buy_date = datetime.strptime(fields['buy_date'], date_format).date().isoformat()
+                break
+            except ValueError:
+                continue
+        else:
+            return None, f"Unrecognized date {fields['buy_date']!r}"
+
+    return {
+        'symbol': _listing_symbol(symbol),
+        'quantity': quantity,
+        'buy_price': buy_price,
+        'buy_date': buy_date,
+        'family_member': fields.get('family_member', '')
+    }, None
+
+def _import_stream():
+    """The uploaded CSV as a binary stream: a multipart 'file' field or the raw request body.
+
+    An upload is detached from the request, which closes its files when the
+    view returns, so it can still be read while the response streams.
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return None
+        stream, upload.stream = upload.stream, io.BytesIO()
+        return stream
+    return request.stream
+
+def _import_lots(email, reader):
+    """Validate, price and store lots from a csv.DictReader, yielding progress and error events"""
+    columns = _import_columns(reader.fieldnames)
+    if 'symbol' not in columns.values() or 'quantity' not in columns.values():
+        yield {"event": "done", "success": False, "error": "CSV needs symbol and quantity columns"}
+        return
+
+    valid_symbols = set()
+    invalid_symbols = set()
+    totals = {'rows': 0, 'imported': 0, 'errors': 0}
+
+    def verify(symbols):
+        """Sort symbols into valid, invalid or unverified (upstream could not be asked)"""
+        unverified = set()
+        # Known to the symbol master or already priced live: no upstream call
+        unknown = []
+        for symbol in symbols:
+            if symbol_master.lookup(symbol) is not None or stock_cache.get_entry(symbol) is not None:
+                valid_symbols.add(symbol)
+            else:
+                unknown.append(symbol)
+        # Ask Yahoo directly rather than through quote_chain, which cannot
+        # tell "no such symbol" from an outage or a missed deadline
+        for i in range(0, len(unknown), MAX_BATCH_SYMBOLS):
+            chunk = unknown[i:i + MAX_BATCH_SYMBOLS]
+            try:
+                priced = _download_symbol_quotes(chunk)
+            except Exception as e:
+                logger.warning("Could not verify %s imported symbols: %s", len(chunk), e)
+                unverified.update(chunk)
+                continue
+            for symbol in chunk:
+                (valid_symbols if symbol in priced else invalid_symbols).add(symbol)
+        return unverified
+
+    def flush(batch):
+        # Quote fetches only for symbols this import has not seen yet
+        new_symbols = sorted({lot['symbol'] for _, lot in batch} - valid_symbols - invalid_symbols)
+        unverified = verify(new_symbols) if new_symbols else set()
+        lots = [lot for _, lot in batch if lot['symbol'] in valid_symbols]
+        if lots:
+            holdings_store.add_lots(email, lots)
+            totals['imported'] += len(lots)
+        for line, lot in batch:
+            name = lot['symbol'].split('.')[0]
+            if lot['symbol'] in invalid_symbols:
+                totals['errors'] += 1
+                yield {"event": "error", "row": line, "error": f"Unknown symbol {name}"}
+            elif lot['symbol'] in unverified:
+                totals['errors'] += 1
+                yield {"event": "error", "row": line, "error": f"Could not verify {name} (market data unavailable); retry this row later"}
+
+    batch = []
+    try:
+        for row in reader:
+            if totals['rows'] >= MAX_IMPORT_ROWS:
+                yield {"event": "error", "row": totals['rows'] + 2, "error": f"Stopped after {MAX_IMPORT_ROWS} rows"}
+                totals['errors'] += 1
+                break
+            totals['rows'] += 1
+            # Row numbers as a spreadsheet shows them, counting the header
+            line = totals['rows'] + 1
+            lot, error = _parse_import_row(row, columns)
+            if error:
+                totals['errors'] += 1
+                yield {"event": "error", "row": line, "error": error}
+                continue
+            batch.append((line, lot))
+            if len(batch) >= IMPORT_BATCH_ROWS:
+                yield from flush(batch)
+                batch = []
+                yield {"event": "progress", **totals}
+        if batch:
+            yield from flush(batch)
+    except (csv.Error, sqlite3.Error) as e:
+        logger.warning("Holdings import for %s stopped at row %s: %s", email, totals['rows'] + 1, e)
+        yield {"event": "done", "success": False, "error": f"Import stopped: {e}", **totals}
+        return
+    yield {"event": "done", "success": True, **totals}
+
+@views.route('/api/portfolio/import', methods=['POST'])
+@login_required
+def portfolio_import_api():
+    """Import lots from a broker CSV export into the server-side holdings.
+
+    Accepts a multipart upload in the 'file' field or a raw text/csv body,
+    read row by row and handled in batches of IMPORT_BATCH_ROWS: symbols new
+    to the import are validated against the symbol master and the quote
+    cache, and the rest with one batched Yahoo download (NSE, then BSE). A
+    symbol is rejected only when Yahoo answers with no data for it; if Yahoo
+    cannot be reached the row is reported as unverified so it can be
+    retried. The batch's valid lots are written in one transaction.
+    The response is newline-delimited JSON: an ``error`` line per rejected
+    row, a ``progress`` line per batch and a final ``done`` line with totals.
+    """
+    if not holdings_store.durable:
+        return jsonify({"success": False, "error": "Importing needs server-side holdings storage (HOLDINGS_DB)"}), 503
+    email = session['user']['email']
+    stream = _import_stream()
+    if stream is None:
+        return jsonify({"success": False, "error": "Upload a CSV file in the 'file' field"})
+
+    def events():
+        try:
+            reader = csv.DictReader(codecs.getreader('utf-8-sig')(stream, errors='replace'))
+            for event in _import_lots(email, reader):
+                yield json.dumps(event) + '\n'
+        finally:
+            stream.close()
+
+    return Response(stream_with_context(events()), mimetype='application/x-ndjson')
+
+@views.route('/api/portfolio/history')
+@login_required
+def portfolio_history_api():
+    """Daily portfolio value series for the logged-in user, optionally only the last ``days`` points"""
+    try:
+        days = int(request.args.get('days', '0'))
+    except ValueError:
+        return jsonify({"success": False, "error": "days must be a number"})
+    dates, values, invested = portfolio_history.load(session['user']['email'])
+    start = max(0, len(dates) - days) if days > 0 else 0
+    return jsonify({
+        "success": True,
+        "dates": [date.fromordinal(ordinal).isoformat() for ordinal in dates[start:]],
+        "value": values[start:].tolist(),
+        "invested": invested[start:].tolist()
+    })
+
+@views.route('/api/portfolio/snapshot', methods=['GET', 'POST'])
+def portfolio_snapshot_api():
+    """Take today's end-of-day snapshot; for schedulers, authorized with 'Bearer $CRON_SECRET'"""
+    secret = os.getenv('CRON_SECRET')
+    if not secret or request.headers.get('Authorization') != f'Bearer {secret}':
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+    try:
+        recorded = portfolio_snapshotter.snapshot_all()
+    except sqlite3.Error as e:
+        logger.warning("Portfolio snapshot failed: %s", e)
+        return jsonify({"success": False, "error": "Holdings are temporarily unavailable"}), 503
+    return jsonify({"success": True, "users": recorded})
+
+def _alerts_disabled():
+    return jsonify({"success": False, "error": "Alerts need server-side holdings storage (HOLDINGS_DB)"}), 503
+
+@views.route('/api/alerts', methods=['GET', 'POST'])
+@login_required
+def alerts_api():
+    """List the user's active alert rules, or add one.
+
+    POST takes ``{"symbol": ..., "kind": ..., "threshold": ...}`` where kind
+    is one of ALERT_KINDS; change thresholds are percent change on the day.
+    """
+    if alert_engine is None:
+        return _alerts_disabled()
+    email = session['user']['email']
+    try:
+        if request.method == 'GET':
+            return jsonify({"success": True, "rules": alert_engine.store.rules(email, limit=MAX_ALERTS_PER_USER)})
+
+        payload = request.get_json(silent=True) or {}
+        symbol = str(payload.get('symbol', '')).upper().strip().split('.')[0]
+        kind = payload.get('kind')
+        try:
+            threshold = float(payload.get('threshold'))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "threshold must be a number"})
+        if not symbol:
+            return jsonify({"success": False, "error": "Symbol is required"})
+        if kind not in ALERT_KINDS:
+            return jsonify({"success": False, "error": f"kind must be one of {', '.join(ALERT_KINDS)}"})
+        if not math.isfinite(threshold) or (kind.startswith('price') and threshold <= 0):
+            return jsonify({"success": False, "error": "threshold is out of range"})
+        rule_id = alert_engine.add_rule(email, symbol, kind, threshold)
+        if rule_id is None:
+            return jsonify({"success": False, "error": f"At most {MAX_ALERTS_PER_USER} active alerts"})
+        # Let the prefetcher keep quoting the symbol while no page has it open
+        quote_prefetcher.track([_listing_symbol(symbol)])
+        return jsonify({"success": True, "id": rule_id})
+    except sqlite3.Error as e:
+        logger.warning("Alert store error for %s: %s", email, e)
+        return jsonify({"success": False, "error": "Alerts are temporarily unavailable"}), 503
+
+@views.route('/api/alerts/<int:rule_id>', methods=['DELETE'])
+@login_required
+def alert_delete_api(rule_id):
+    """Delete one of the user's alert rules, active or fired"""
+    if alert_engine is None:
+        return _alerts_disabled()
+    try:
+        if not alert_engine.remove_rule(session['user']['email'], rule_id):
+            return jsonify({"success": False, "error": "Alert not found"}), 404
+    except sqlite3.Error as e:
+        logger.warning("Alert store error: %s", e)
+        return jsonify({"success": False, "error": "Alerts are temporarily unavailable"}), 503
+    return jsonify({"success": True})
+
+@views.route('/api/alerts/fired')
+@login_required
+def alerts_fired_api():
+    """Alerts fired after ``since`` (a Unix timestamp), newest first; poll with the latest fired_at seen"""
+    if alert_engine is None:
+        return _alerts_disabled()
+    try:
+        since = float(request.args.get('since', '0'))
+    except ValueError:
+        return jsonify({"success": False, "error": "since must be a number"})
+    try:
+        fired = alert_engine.store.rules(session['user']['email'], fired=True, since=since)
+    except sqlite3.Error as e:
+        logger.warning("Alert store error: %s", e)
+        return jsonify({"success": False, "error": "Alerts are temporarily unavailable"}), 503
+    return jsonify({"success": True, "alerts": fired})
+
+@views.route('/mutual-funds')
 @login_required
 def mutual_funds():
     # Empty initial data, client will load from Firebase
     return render_template('mutual_funds.html', mutual_funds=[])
 
-@app.route('/api/mutual-fund')
+@views.route('/api/mutual-fund')
 @login_required
 def get_mutual_fund_data():
     """API endpoint to get mutual fund data"""
     scheme_code = request.args.get('scheme_code', '').strip()
     if not scheme_code:
         return jsonify({"success": False, "error": "Scheme code is required"})
-    
+
     try:
-        response = requests.get(
-            f'https://api.mfapi.in/mf/{scheme_code}',
-            timeout=10,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-        )
-        
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                if data and data.get('status') == 'SUCCESS':
-                    return jsonify({
-                        "success": True,
-                        "scheme_code": scheme_code,
-                        "scheme_name": data['meta']['scheme_name'],
-                        "nav": data['data'][0]['nav'],
-                        "date": data['data'][0]['date']
-                    })
-            except:
-                pass
-                
-        # Return fallback data if API fails
-        return jsonify({
-            "success": True,
-            "scheme_code": scheme_code,
-            "scheme_name": f"Mutual Fund {scheme_code}",
-            "nav": "32.456",
-            "date": datetime.now().strftime('%d-%m-%Y')
-        })
+        result = mf_client.latest_nav(scheme_code)
+        if result:
+            return cached_entry_response(mf_cache, scheme_code, result)
     except Exception as e:
-        # Return fallback data if API fails
-        return jsonify({
-            "success": True,
-            "scheme_code": scheme_code,
-            "scheme_name": f"Mutual Fund {scheme_code}",
-            "nav": "32.456",
-            "date": datetime.now().strftime('%d-%m-%Y')
-        })
+        logger.warning("Error fetching NAV for %s: %s", scheme_code, e)
+
+    # Prefer the last real NAV over placeholder data
+    stale_data = mf_cache.get_stale(scheme_code)
+    if stale_data:
+        fallback_used.inc('mutual_fund', 'stale')
+        return cached_entry_response(mf_cache, scheme_code, stale_data)
+
+    scheme_index.ensure_fresh()
+    snapshot = scheme_index.lookup(scheme_code)
+    if snapshot and snapshot['nav']:
+        fallback_used.inc('mutual_fund', 'snapshot')
+        return jsonify(dict(snapshot, success=True))
+
+    # Return fallback data if API fails
+    fallback_used.inc('mutual_fund', 'generated')
+    return jsonify({
+        "success": True,
+        "scheme_code": scheme_code,
+        "scheme_name": f"Mutual Fund {scheme_code}",
+        "nav": "32.456",
+        "date": datetime.now().strftime('%d-%m-%Y')
+    })
+
+# Upper bound on schemes accepted by /api/mutual-fund/batch
+MAX_BATCH_SCHEMES = 100
+
+@views.route('/api/mutual-fund/search')
+@login_required
+def mutual_fund_search_api():
+    """API endpoint for scheme name and code search over the local AMFI scheme index"""
+    query = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    if not query.strip():
+        return jsonify({"success": False, "error": "Query is required"})
+    scheme_index.ensure_fresh()
+    return jsonify({"success": True, "results": scheme_index.search(query, limit)})
+
+@views.route('/api/mutual-fund/batch')
+@login_required
+def mutual_fund_batch_api():
+    """Latest NAVs for many schemes in one request.
+
+    Answers from mf_cache, then from the AMFI snapshot while it is fresh,
+    and fetches only the remaining schemes from mfapi, concurrently under
+    one deadline. Schemes still unanswered fall back to their last cached
+    NAV, then to an older snapshot.
+    """
+    codes = list(dict.fromkeys(code.strip() for code in request.args.get('codes', '').split(',') if code.strip()))
+    if not codes:
+        return jsonify({"success": False, "error": "Scheme codes are required"})
+    if len(codes) > MAX_BATCH_SCHEMES:
+        return jsonify({"success": False, "error": f"At most {MAX_BATCH_SCHEMES} schemes per request"})
+    if not all(code.isdigit() for code in codes):
+        return jsonify({"success": False, "error": "Scheme codes must be numeric"})
 
-@app.route('/insurance')
+    scheme_index.ensure_fresh()
+    snapshot_fresh = scheme_index.is_fresh()
+    results = {}
+    futures = {}
+    for code in codes:
+        cached_data = mf_cache.get(code)
+        if cached_data:
+            results[code] = cached_data
+            continue
+        snapshot = scheme_index.lookup(code) if snapshot_fresh else None
+        if snapshot and snapshot['nav']:
+            results[code] = dict(snapshot, success=True)
+        else:
+            futures[quote_pool.submit(mf_client.latest_nav, code)] = code
+
+    if futures:
+        done, not_done = wait(futures, timeout=PAGE_FETCH_DEADLINE)
+        # Free quote_pool for other requests; these schemes use the fallbacks below
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning("Error fetching NAV for %s: %s", futures[future], e)
+                continue
+            if result:
+                results[futures[future]] = result
+
+    for code in codes:
+        if code in results:
+            continue
+        stale_data = mf_cache.get_stale(code)
+        snapshot = scheme_index.lookup(code)
+        if stale_data:
+            fallback_used.inc('mutual_fund', 'stale')
+            results[code] = stale_data
+        elif snapshot and snapshot['nav']:
+            fallback_used.inc('mutual_fund', 'snapshot')
+            results[code] = dict(snapshot, success=True)
+        else:
+            results[code] = {"success": False, "scheme_code": code, "error": "No NAV available"}
+    return jsonify({"success": True, "data": results})
+
+def _nav_history_or_error(scheme_code):
+    if not scheme_code.isdigit():
+        return None, jsonify({"success": False, "error": "A numeric scheme code is required"})
+    series = nav_history.get(scheme_code)
+    if not series:
+        return None, jsonify({"success": False, "error": "No NAV history available"})
+    return series, None
+
+@views.route('/api/mutual-fund/returns')
+@login_required
+def mutual_fund_returns_api():
+    """API endpoint for trailing returns (absolute and CAGR) from local NAV history"""
+    scheme_code = request.args.get('scheme_code', '').strip()
+    series, error = _nav_history_or_error(scheme_code)
+    if error:
+        return error
+
+    returns = {}
+    for name, days in RETURN_PERIODS.items():
+        result = series.period_return(days)
+        if result is None:
+            returns[name] = None
+            continue
+        start, absolute, cagr = result
+        returns[name] = {
+            "from": date.fromordinal(series.dates[start]).isoformat(),
+            "return": round(absolute, 4),
+            "cagr": round(cagr, 4)
+        }
+
+    return jsonify({
+        "success": True,
+        "scheme_code": scheme_code,
+        "latest_date": date.fromordinal(series.dates[-1]).isoformat(),
+        "latest_nav": series.navs[-1],
+        "records": len(series),
+        "returns": returns
+    })
+
+@views.route('/api/mutual-fund/drawdown')
+@login_required
+def mutual_fund_drawdown_api():
+    """API endpoint for the maximum drawdown over a trailing window of NAV history"""
+    scheme_code = request.args.get('scheme_code', '').strip()
+    period = request.args.get('period', 'max').strip().lower()
+    if period != 'max' and period not in RETURN_PERIODS:
+        return jsonify({"success": False, "error": f"Unknown period: {period}"})
+
+    series, error = _nav_history_or_error(scheme_code)
+    if error:
+        return error
+
+    since = None if period == 'max' else series.dates[-1] - RETURN_PERIODS[period]
+    drawdown, peak, trough = series.max_drawdown(since)
+    return jsonify({
+        "success": True,
+        "scheme_code": scheme_code,
+        "period": period,
+        "max_drawdown": round(drawdown, 4),
+        "peak": {"date": date.fromordinal(series.dates[peak]).isoformat(), "nav": series.navs[peak]},
+        "trough": {"date": date.fromordinal(series.dates[trough]).isoformat(), "nav": series.navs[trough]}
+    })
+
+@views.route('/insurance')
 @login_required
 def insurance():
     # Empty initial data, client will load from Firebase
     return render_template('insurance.html', policies=[])
 
+def create_app(config=None):
+    """Build the Flask app around the shared views; ``config`` overrides app.config"""
+    app = Flask(__name__)
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24))
+    if config:
+        app.config.update(config)
+    app.register_blueprint(views)
+    return app
+
+# Module-level app for Vercel, gunicorn (main:app) and python main.py
+app = create_app()
+startup_timings['import'] = round(time.perf_counter() - IMPORT_STARTED, 4)
+logger.info("Imported app in %.1fms", startup_timings['import'] * 1000)
+
+def startup_report(path='/login'):
+    """Time one request against the freshly imported app and return all startup timings"""
+    with app.test_client() as client:
+        client.get(path)
+    return dict(startup_timings)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if '--startup-report' in sys.argv:
+        # python main.py --startup-report [path]: print cold-start timings as JSON and exit
+        args = sys.argv[sys.argv.index('--startup-report') + 1:]
+        print(json.dumps(startup_report(*args[:1]), indent=2))
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,44 @@
+"""Yahoo Finance access through yfinance.
+
+Importing this module pulls in yfinance and pandas, so main.py only imports
+it on the first request that needs live market data. Results are returned
+as plain dicts and lists so callers never handle DataFrames.
+"""
+import math
+
+import yfinance as yf
+
+def _closes(frame):
+    """Daily closes from a history frame, oldest first, without missing values"""
+    if frame is None or frame.empty or 'Close' not in frame:
+        return []
+    return [float(value) for value in frame['Close'] if not math.isnan(value)]
+
+def quote_info(symbol):
+    """The yfinance ``info`` dict for one ticker"""
+    return yf.Ticker(symbol).info
+
+def daily_closes(symbol, period='2d'):
+    """Recent daily closes for one ticker, oldest first"""
+    return _closes(yf.Ticker(symbol).history(period=period))
+
+def download_daily_closes(symbols, period='5d'):
+    """Daily closes for many tickers in one round-trip.
+
+    Returns a dict mapping each ticker that produced data to its closes,
+    oldest first.
+    """
+    history = yf.download(symbols, period=period, group_by='ticker', progress=False, threads=False)
+    if history is None or history.empty:
+        return {}
+
+    closes = {}
+    multi_ticker = getattr(history.columns, 'nlevels', 1) > 1
+    tickers = set(history.columns.get_level_values(0)) if multi_ticker else None
+    for symbol in symbols:
+        if multi_ticker and symbol not in tickers:
+            continue
+        values = _closes(history[symbol] if multi_ticker else history)
+        if values:
+            closes[symbol] = values
+    return closes
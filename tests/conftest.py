@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Keep the app's side files out of the working tree and make the repo root importable
+os.environ.setdefault('HOLDINGS_DB', os.path.join(tempfile.mkdtemp(prefix='fintrack-tests-'), 'holdings.db'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,80 @@
+import pytest
+
+import main
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'alerts.db')
+
+@pytest.fixture
+def engine(db_path):
+    return main.AlertEngine(main.AlertStore(db_path))
+
+def fired_ids(engine, email):
+    return sorted(rule['id'] for rule in engine.store.rules(email, fired=True))
+
+def test_price_above_fires_every_threshold_at_or_below_the_price(engine):
+    low = engine.add_rule('a@x.com', 'TCS', 'price_above', 100)
+    exact = engine.add_rule('a@x.com', 'TCS', 'price_above', 150)
+    high = engine.add_rule('a@x.com', 'TCS', 'price_above', 200)
+
+    assert engine.evaluate({'TCS': (150.0, 1.0)}) == 2
+    assert fired_ids(engine, 'a@x.com') == sorted([low, exact])
+    assert [rule['id'] for rule in engine.store.rules('a@x.com')] == [high]
+
+def test_price_below_fires_every_threshold_at_or_above_the_price(engine):
+    engine.add_rule('a@x.com', 'TCS', 'price_below', 100)
+    hit = engine.add_rule('a@x.com', 'TCS', 'price_below', 120)
+
+    assert engine.evaluate({'TCS': (110.0, 1.0)}) == 1
+    assert fired_ids(engine, 'a@x.com') == [hit]
+
+def test_change_rules_match_the_percent_change(engine):
+    up = engine.add_rule('a@x.com', 'INFY', 'change_above', 2)
+    down = engine.add_rule('a@x.com', 'INFY', 'change_below', -2)
+
+    assert engine.evaluate({'INFY': (1500.0, 2.5)}) == 1
+    assert engine.evaluate({'INFY': (1400.0, -3.0)}) == 1
+    assert fired_ids(engine, 'a@x.com') == sorted([up, down])
+
+def test_rules_fire_once_and_only_for_their_symbol(engine):
+    engine.add_rule('a@x.com', 'TCS', 'price_above', 100)
+
+    assert engine.evaluate({'INFY': (500.0, 0.0)}) == 0
+    assert engine.evaluate({'TCS': (101.0, 0.0)}) == 1
+    assert engine.evaluate({'TCS': (102.0, 0.0)}) == 0
+    assert engine.counters['fired'] == 1
+
+def test_removed_rules_do_not_fire(engine):
+    rule_id = engine.add_rule('a@x.com', 'TCS', 'price_above', 100)
+
+    assert engine.remove_rule('b@x.com', rule_id) is False
+    assert engine.remove_rule('a@x.com', rule_id) is True
+    assert engine.evaluate({'TCS': (150.0, 0.0)}) == 0
+
+def test_add_rule_enforces_the_per_user_limit(engine):
+    ids = [engine.add_rule('a@x.com', 'TCS', 'price_above', 100 + i, limit=3) for i in range(4)]
+
+    assert ids[3] is None
+    assert engine.add_rule('b@x.com', 'TCS', 'price_above', 100, limit=3) is not None
+    # A fired rule no longer counts against the limit
+    engine.evaluate({'TCS': (100.0, 0.0)})
+    assert engine.add_rule('a@x.com', 'TCS', 'price_above', 500, limit=3) is not None
+
+def test_engines_sharing_a_store_sync_changed_rules(db_path):
+    first = main.AlertEngine(main.AlertStore(db_path))
+    second = main.AlertEngine(main.AlertStore(db_path))
+    rule_id = first.add_rule('a@x.com', 'TCS', 'price_above', 100)
+    second.evaluate({})
+    assert second.stats()['rules'] == 1
+
+    # A rule fired by one engine is dropped by the other rather than fired again
+    assert first.evaluate({'TCS': (150.0, 0.0)}) == 1
+    assert second.evaluate({'TCS': (150.0, 0.0)}) == 0
+    assert second.counters['fired'] == 0
+    assert fired_ids(first, 'a@x.com') == [rule_id]
+
+    # Rules added by another engine are matched without a restart
+    other = second.add_rule('b@x.com', 'INFY', 'price_below', 10)
+    assert first.evaluate({'INFY': (9.0, 0.0)}) == 1
+    assert fired_ids(first, 'b@x.com') == [other]
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import main
+
+def test_get_returns_fresh_values_and_expired_ones_only_as_stale():
+    cache = main.TTLCache(default_ttl=60)
+    cache.set('fresh', 1)
+    cache.set('expired', 2, ttl=-1)
+
+    assert cache.get('fresh') == 1
+    assert cache.get('expired') is None
+    assert cache.get_stale('expired') == 2
+    assert cache.get('missing') is None
+    assert cache.get_stale('missing') is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = main.TTLCache(max_entries=2, shards=1, default_ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get_entry('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_callable_default_ttl_is_evaluated_per_set():
+    ttls = iter([60, -1])
+    cache = main.TTLCache(default_ttl=lambda: next(ttls))
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+
+def test_listeners_see_every_set():
+    cache = main.TTLCache(default_ttl=60)
+    seen = []
+    cache.listeners.append(lambda key, value: seen.append((key, value)))
+    cache.set('a', 1)
+
+    assert seen == [('a', 1)]
+
+def test_expired_entry_is_replaced_by_a_fresher_disk_row(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    worker_a = main.TTLCache(default_ttl=60, backing=main.PersistentCache(path))
+    worker_b = main.TTLCache(default_ttl=60, backing=main.PersistentCache(path))
+    worker_a.set('X', 'old', ttl=-1)
+    worker_b.set('X', 'new')
+
+    assert worker_a.get('X') == 'new'
+    assert worker_a.stats()['disk_hits'] == 1
+
+def test_missing_key_reads_through_to_disk(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    main.TTLCache(default_ttl=60, backing=main.PersistentCache(path)).set('X', {'v': 1})
+    cache = main.TTLCache(default_ttl=60, backing=main.PersistentCache(path))
+
+    assert cache.get('X') == {'v': 1}
+
+def test_closed_market_quote_ttl_stops_at_the_next_open():
+    # Monday 08:00 IST, 75 minutes before the 09:15 open
+    assert main.quote_ttl(datetime(2026, 10, 19, 8, 0, tzinfo=main.IST)) == 4500
+    assert main.quote_ttl(datetime(2026, 10, 19, 10, 0, tzinfo=main.IST)) == main.QUOTE_TTL_MARKET
+    assert main.quote_ttl(datetime(2026, 10, 17, 12, 0, tzinfo=main.IST)) == main.QUOTE_TTL_CLOSED
@@ -0,0 +1,48 @@
+import math
+
+import numpy as np
+
+from valuation import group_totals, value_lots, xirr
+
+def test_xirr_single_group():
+    rates = xirr([-1000.0, 1100.0], [0.0, 1.0])
+    assert rates.shape == (1,)
+    assert math.isclose(rates[0], 0.1, rel_tol=1e-6)
+
+def test_xirr_solves_several_groups_independently():
+    amounts = [-1000.0, 1210.0, -500.0, 600.0, -100.0, -100.0, 230.0]
+    years = [0.0, 2.0, 0.0, 1.0, 0.0, 0.5, 1.5]
+    groups = [0, 0, 1, 1, 2, 2, 2]
+    rates = xirr(amounts, years, groups, n_groups=3)
+
+    assert math.isclose(rates[0], 0.1, rel_tol=1e-6)
+    assert math.isclose(rates[1], 0.2, rel_tol=1e-6)
+    # Each answer zeroes its own group's NPV and matches solving the group alone
+    flows = np.array(amounts)[4:]
+    times = np.array(years)[4:]
+    assert abs(np.sum(flows * (1 + rates[2]) ** -times)) < 1e-6
+    assert math.isclose(rates[2], xirr(flows, times)[0], rel_tol=1e-9)
+
+def test_xirr_group_without_sign_change_is_nan():
+    rates = xirr([-1000.0, -200.0, -1000.0, 1100.0], [0.0, 1.0, 0.0, 1.0], [0, 0, 1, 1], n_groups=2)
+    assert math.isnan(rates[0])
+    assert math.isclose(rates[1], 0.1, rel_tol=1e-6)
+
+def test_xirr_empty_group_is_nan():
+    rates = xirr([-1000.0, 1100.0], [0.0, 1.0], [0, 0], n_groups=2)
+    assert math.isnan(rates[1])
+
+def test_xirr_not_converged_is_nan():
+    # One Newton step from the default guess cannot reach the 50% root
+    rates = xirr([-1000.0, 1500.0], [0.0, 1.0], max_iter=1)
+    assert math.isnan(rates[0])
+    assert math.isclose(xirr([-1000.0, 1500.0], [0.0, 1.0])[0], 0.5, rel_tol=1e-6)
+
+def test_value_lots_and_group_totals():
+    lots = value_lots([10, 5, 2], [100.0, 20.0, 50.0], [110.0, 20.0, 40.0], [10.0, 0.0, -20.0])
+    assert np.allclose(lots['invested'], [1000.0, 100.0, 100.0])
+    assert np.allclose(lots['pnl'], [100.0, 0.0, -20.0])
+    assert np.allclose(lots['day_change'], [100.0, 0.0, -20.0])
+
+    totals = group_totals(lots, np.array([0, 1, 0]), 2)
+    assert np.allclose(totals['current_value'], [1180.0, 100.0])
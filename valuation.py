@@ -0,0 +1,73 @@
+import numpy as np
+
+DAYS_PER_YEAR = 365.0
+
+def value_lots(quantities, buy_prices, prices, changes):
+    """Value every lot in one vectorized pass.
+
+    All arguments are equal-length arrays, one entry per lot; ``changes`` is
+    the day's percentage change of each lot's price. Returns a dict of
+    per-lot arrays: invested, current_value, pnl and day_change.
+    """
+    quantities = np.asarray(quantities, dtype=np.float64)
+    buy_prices = np.asarray(buy_prices, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    changes = np.asarray(changes, dtype=np.float64)
+
+    invested = quantities * buy_prices
+    current_value = quantities * prices
+    # Previous close implied by today's percentage change
+    previous_prices = prices / (1.0 + changes / 100.0)
+    day_change = quantities * (prices - previous_prices)
+    return {
+        'invested': invested,
+        'current_value': current_value,
+        'pnl': current_value - invested,
+        'day_change': day_change
+    }
+
+def group_totals(lot_values, groups, n_groups):
+    """Sum each per-lot array in lot_values into n_groups buckets"""
+    return {
+        name: np.bincount(groups, weights=values, minlength=n_groups)
+        for name, values in lot_values.items()
+    }
+
+def xirr(amounts, years, groups=None, n_groups=1, guess=0.1, tol=1e-7, max_iter=100):
+    """Solve XIRR for several independent cash-flow groups at once.
+
+    ``amounts`` are signed cash flows (outflows negative) and ``years`` the
+    time of each flow in years from a common origin. ``groups`` assigns each
+    flow to one of ``n_groups`` portfolios; every group runs the same Newton
+    iteration in lock-step using array operations. Returns an array of
+    annualized rates, with NaN where a group has no sign change or does not
+    converge.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    if groups is None:
+        groups = np.zeros(len(amounts), dtype=np.intp)
+    groups = np.asarray(groups, dtype=np.intp)
+
+    has_inflow = np.bincount(groups, weights=(amounts > 0), minlength=n_groups) > 0
+    has_outflow = np.bincount(groups, weights=(amounts < 0), minlength=n_groups) > 0
+    solvable = has_inflow & has_outflow
+
+    rates = np.full(n_groups, guess, dtype=np.float64)
+    converged = np.zeros(n_groups, dtype=bool)
+    for _ in range(max_iter):
+        base = 1.0 + rates[groups]
+        discounted = amounts * base ** (-years)
+        npv = np.bincount(groups, weights=discounted, minlength=n_groups)
+        derivative = np.bincount(groups, weights=-years * discounted / base, minlength=n_groups)
+
+        step = np.divide(npv, derivative, out=np.zeros(n_groups), where=derivative != 0)
+        # Keep 1 + rate positive so the discount factors stay defined
+        updated = np.maximum(rates - step, -0.9999)
+        converged = np.abs(updated - rates) < tol
+        rates = updated
+        if np.all(converged | ~solvable):
+            break
+
+    rates[~(solvable & converged & np.isfinite(rates))] = np.nan
+    return rates